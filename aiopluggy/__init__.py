@@ -1,4 +1,7 @@
-from .hooks import HookCallError, HookValidationError
+from .hooks import (
+    HookCallError, HookFailureException, HookValidationError,
+    HookWrapperException
+)
 from .markers import HookspecMarker, HookimplMarker
 from .plugin_manager import PluginManager
 from .helpers import Result
@@ -0,0 +1,147 @@
+""" Detection of synchronous hook functions that block the event loop; see
+:meth:`aiopluggy.PluginManager.enable_blocking_detector`.
+"""
+import asyncio
+import functools
+import time
+
+try:
+    import contextvars
+except ImportError:  # Python < 3.7
+    contextvars = None
+
+from .helpers import fqn
+
+
+_call_lag = None if contextvars is None \
+    else contextvars.ContextVar('aiopluggy_call_lag', default=None)
+"""Blocking time of the asynchronous hook call in progress, as a one item
+list."""
+
+
+class _Totals(object):
+    __slots__ = ('count', 'seconds', 'max')
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.max = 0.0
+
+    def add(self, seconds):
+        self.count += 1
+        self.seconds += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def as_dict(self):
+        return {'count': self.count, 'seconds': self.seconds, 'max': self.max}
+
+
+class BlockingDetector(object):
+    """Times the synchronous hook functions that asynchronous hook calls run
+    on the event loop.
+
+    Args:
+        threshold: report hook functions that run for at least this many
+            seconds.
+        callback: called as ``callback(plugin_name, hook_name, seconds)`` for
+            each call over the ``threshold``.
+
+    """
+    def __init__(self, threshold=.01, callback=None):
+        self.threshold = threshold
+        self.callback = callback
+        self.offenders = {}
+        """Calls over the threshold, indexed by ``(plugin_name, hook_name)``.
+
+        :type: dict[tuple[str, str], _Totals]
+
+        """
+        self.call_lag = {}
+        """Time per asynchronous hook call that its synchronous hook functions
+        blocked the event loop, indexed by hook name. Requires
+        :mod:`contextvars` (Python 3.7).
+
+        :type: dict[str, _Totals]
+
+        """
+
+    def watch(self, hookimpl, function):
+        """Wrap the synchronous ``function`` of ``hookimpl`` to time it."""
+        clock = time.perf_counter
+        plugin_name = fqn(hookimpl.plugin)
+        hook_name = hookimpl.name
+
+        @functools.wraps(function)
+        def watched(**kwargs):
+            start = clock()
+            try:
+                return function(**kwargs)
+            finally:
+                self._observe(plugin_name, hook_name, clock() - start)
+        return watched
+
+    def watch_call(self, hook_name, call):
+        """Wrap :meth:`HookCaller.call <aiopluggy.hook_caller.HookCaller.call>`
+        to add up the blocking time per asynchronous hook call."""
+        if _call_lag is None:
+            return call
+
+        async def finish(coro):
+            lag = [0.0]
+            token = _call_lag.set(lag)
+            try:
+                return await coro
+            finally:
+                _call_lag.reset(token)
+                totals = self.call_lag.get(hook_name)
+                if totals is None:
+                    totals = self.call_lag[hook_name] = _Totals()
+                totals.add(lag[0])
+
+        @functools.wraps(call)
+        def watched_hook_call(kwargs, **options):
+            result = call(kwargs, **options)
+            if asyncio.iscoroutine(result):
+                return finish(result)
+            return result
+        return watched_hook_call
+
+    def _observe(self, plugin_name, hook_name, seconds):
+        if _call_lag is not None:
+            lag = _call_lag.get()
+            if lag is not None:
+                lag[0] += seconds
+        if seconds < self.threshold:
+            return
+        key = (plugin_name, hook_name)
+        totals = self.offenders.get(key)
+        if totals is None:
+            totals = self.offenders[key] = _Totals()
+        totals.add(seconds)
+        if self.callback is not None:
+            self.callback(plugin_name, hook_name, seconds)
+
+    def report(self):
+        """Aggregated offenders, worst first, and blocking time per hook
+        call::
+
+            {
+                'offenders': [{'plugin': plugin_name, 'hook': hook_name,
+                               'count': n, 'seconds': total, 'max': max}],
+                'call_lag': {hook_name: {'count': n, 'seconds': total,
+                                         'max': max}},
+            }
+
+        """
+        offenders = [
+            dict(totals.as_dict(), plugin=plugin_name, hook=hook_name)
+            for (plugin_name, hook_name), totals in self.offenders.items()
+        ]
+        offenders.sort(key=lambda offender: offender['seconds'], reverse=True)
+        return {
+            'offenders': offenders,
+            'call_lag': {
+                name: totals.as_dict() for name, totals in self.call_lag.items()
+            },
+        }
@@ -0,0 +1,91 @@
+""" Result cache of ``cached`` hooks; see
+:meth:`aiopluggy.hook_caller.HookCaller.cache_info`.
+"""
+import collections
+import operator
+import time
+
+
+CacheInfo = collections.namedtuple(
+    'CacheInfo', ('hits', 'misses', 'maxsize', 'currsize')
+)
+"""Statistics of a :class:`ResultCache`, like those of
+:func:`functools.lru_cache`."""
+
+
+_by_name = operator.itemgetter(0)
+
+
+class ResultCache(object):
+    """Least recently used results of a single hook, indexed by call
+    arguments.
+
+    Args:
+        maxsize: remember at most this many results; the least recently used
+            results are forgotten first. ``None`` means unbounded.
+        ttl: forget results after this many seconds.
+        clock: source of the timestamps used for ``ttl``.
+
+    """
+    def __init__(self, maxsize=128, ttl=None, clock=time.monotonic):
+        if maxsize is not None and maxsize < 1:
+            raise ValueError("maxsize must be at least 1")
+        if ttl is not None and ttl <= 0:
+            raise ValueError("ttl must be positive")
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._clock = clock
+        self._entries = collections.OrderedDict()
+        """``(timestamp, value)`` tuples, indexed by key, least recently used
+        first."""
+        self.hits = 0
+        self.misses = 0
+        self.generation = 0
+        """Incremented by :meth:`clear`, so that calls that started before
+        don't store their results."""
+
+    @staticmethod
+    def key(kwargs):
+        """The cache key of a call, or ``None`` if an argument value isn't
+        hashable."""
+        key = tuple(sorted(kwargs.items(), key=_by_name))
+        try:
+            hash(key)
+        except TypeError:
+            return None
+        return key
+
+    def get(self, key, default=None):
+        """The cached value for ``key``, or ``default``."""
+        entry = self._entries.get(key)
+        if entry is not None:
+            timestamp, value = entry
+            if self.ttl is None or self._clock() - timestamp < self.ttl:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return value
+            del self._entries[key]
+        self.misses += 1
+        return default
+
+    def put(self, key, value, generation):
+        """Remember ``value`` for ``key``, unless the cache was cleared since
+        ``generation``."""
+        if generation != self.generation:
+            return
+        entries = self._entries
+        entries[key] = (self._clock(), value)
+        entries.move_to_end(key)
+        if self.maxsize is not None and len(entries) > self.maxsize:
+            entries.popitem(last=False)
+
+    def clear(self):
+        """Forget all results, but keep the statistics."""
+        self._entries.clear()
+        self.generation += 1
+
+    def info(self):
+        """:rtype: CacheInfo"""
+        return CacheInfo(
+            self.hits, self.misses, self.maxsize, len(self._entries)
+        )
@@ -1,4 +1,6 @@
+import asyncio
 import inspect
+import weakref
 
 
 def fqn(namespace) -> str:
@@ -21,6 +23,8 @@ def fqn(namespace) -> str:
 
 
 class Result(object):
+    __slots__ = ('_value', '_exc_info')
+
     def __init__(self, value=None, exc_info=None):
         assert exc_info is None or exc_info[1] is not None
         self._value = value
@@ -64,3 +68,32 @@ class Result(object):
 
         """
         return self._exc_info[1] if self._exc_info else None
+
+
+class LazySemaphore(object):
+    """Asynchronous context manager like :class:`asyncio.Semaphore`, that can
+    be created outside of the event loop.
+
+    Before Python 3.10, a semaphore is bound to the current event loop when
+    it is created. This one creates a semaphore per event loop, on first use
+    inside that loop.
+
+    """
+    __slots__ = ('value', '_semaphores')
+
+    def __init__(self, value):
+        self.value = value
+        self._semaphores = weakref.WeakKeyDictionary()
+
+    def _semaphore(self):
+        loop = asyncio.get_event_loop()
+        semaphore = self._semaphores.get(loop)
+        if semaphore is None:
+            semaphore = self._semaphores[loop] = asyncio.Semaphore(self.value)
+        return semaphore
+
+    async def __aenter__(self):
+        await self._semaphore().acquire()
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        self._semaphore().release()
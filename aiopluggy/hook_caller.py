@@ -1,10 +1,17 @@
 import asyncio
+import collections
+import copy
+import functools
+import importlib
+import pickle
 import weakref
 
 import sys
 
-from .hooks import HookSpec
+from .cache import ResultCache
+from .hooks import HookFailureException, HookSpec, HookWrapperException
 from .helpers import Result
+from .metrics import metered
 
 
 def _priority_groups(hookimpls):
@@ -19,6 +26,430 @@ def _priority_groups(hookimpls):
     return result
 
 
+def _projection(hookimpl, spec):
+    """Names of the caller arguments that ``hookimpl`` accepts.
+
+    Returns ``None`` if the (validated) caller arguments can be passed to
+    ``hookimpl`` unfiltered.
+
+    """
+    if spec is not None and hookimpl.argnames >= spec.argnames:
+        return None
+    return tuple(sorted(hookimpl.argnames))
+
+
+def _project(caller_kwargs, argnames):
+    if argnames is None:
+        return caller_kwargs
+    if argnames is _PICKLED:
+        return {'payload': caller_kwargs.payload}
+    return {
+        name: caller_kwargs[name] for name in argnames if name in caller_kwargs
+    }
+
+
+def _with_semaphore(semaphore, function):
+    @functools.wraps(function)
+    async def limited(**kwargs):
+        async with semaphore:
+            return await function(**kwargs)
+    return limited
+
+
+def _with_timeout(timeout, function):
+    @functools.wraps(function)
+    def timed(**kwargs):
+        return asyncio.wait_for(function(**kwargs), timeout)
+    return timed
+
+
+def _in_thread(executor, function):
+    @functools.wraps(function)
+    def threaded(**kwargs):
+        return asyncio.get_event_loop().run_in_executor(
+            executor, functools.partial(function, **kwargs)
+        )
+    return threaded
+
+
+_PICKLED = object()
+"""Projection of ``in_process`` hook functions: they take the caller
+arguments as a single pickled ``payload``; see :class:`_PicklingKwargs`."""
+
+
+class _PicklingKwargs(dict):
+    """Caller arguments of a single hook call, that are pickled once, on first
+    use by an ``in_process`` hook function."""
+    __slots__ = ('_payload',)
+
+    def __init__(self, caller_kwargs):
+        super().__init__(caller_kwargs)
+        self._payload = None
+
+    @property
+    def payload(self):
+        if self._payload is None:
+            self._payload = pickle.dumps(dict(self), pickle.HIGHEST_PROTOCOL)
+        return self._payload
+
+
+def _needs_pickling(plan, functions=None):
+    if functions is None:
+        return plan.in_process
+    return any(hookimpl.is_in_process for hookimpl in functions)
+
+
+@functools.lru_cache(maxsize=None)
+def _load_plugin(target):
+    if isinstance(target, str):
+        return importlib.import_module(target)
+    return pickle.loads(target)
+
+
+def _call_in_process(target, name, argnames, payload):
+    """Runs in a worker process."""
+    kwargs = _project(pickle.loads(payload), argnames)
+    return getattr(_load_plugin(target), name)(**kwargs)
+
+
+def _in_process(executor, hookimpl, argnames):
+    """Returns a function that runs ``hookimpl`` by ``executor``.
+
+    The returned function takes the pickled caller arguments as its
+    ``payload`` argument, and ``argnames`` is applied in the worker process.
+
+    """
+    target = hookimpl.process_target
+
+    @functools.wraps(hookimpl.function)
+    def in_process(payload):
+        return asyncio.get_event_loop().run_in_executor(
+            executor, _call_in_process, target, hookimpl.name, argnames,
+            payload
+        )
+    return in_process
+
+
+def _is_async(hookimpl, plugin_manager):
+    return hookimpl.is_async or (
+        plugin_manager is not None and
+        (hookimpl.is_in_thread or hookimpl.is_in_process)
+    )
+
+
+def _function(hookimpl, plugin_manager=None, argnames=None, metrics=None):
+    """The function to call for ``hookimpl``, subject to its timeout and its
+    plugin's concurrency limit.
+
+    If a ``plugin_manager`` is given, the function is meant for the
+    asynchronous call loops: ``in_thread`` and ``in_process`` hook functions
+    are then run by the plugin manager's executors, and treated as
+    asynchronous, and synchronous hook functions are timed by the plugin
+    manager's blocking detector, if any. If ``metrics`` are given, calls are
+    recorded.
+
+    """
+    function = hookimpl.function
+    if plugin_manager is not None and hookimpl.is_in_thread:
+        function = _in_thread(plugin_manager.executor, function)
+    elif plugin_manager is not None and hookimpl.is_in_process:
+        function = _in_process(
+            plugin_manager.process_executor, hookimpl, argnames
+        )
+    if hookimpl.semaphore is not None and \
+            _is_async(hookimpl, plugin_manager):
+        function = _with_semaphore(hookimpl.semaphore, function)
+    if hookimpl.timeout is not None and _is_async(hookimpl, plugin_manager):
+        function = _with_timeout(hookimpl.timeout, function)
+    if plugin_manager is not None and \
+            plugin_manager.blocking_detector is not None and \
+            not _is_async(hookimpl, plugin_manager):
+        function = plugin_manager.blocking_detector.watch(hookimpl, function)
+    if metrics is not None:
+        function = metered(
+            metrics.hookimpl(hookimpl), function,
+            _is_async(hookimpl, plugin_manager)
+        )
+    return function
+
+
+def _compile_one(hookimpl, spec, plugin_manager, metrics):
+    argnames = _projection(hookimpl, spec)
+    if plugin_manager is not None and hookimpl.is_in_process:
+        # Projected in the worker process; see _in_process().
+        return hookimpl, \
+            _function(hookimpl, plugin_manager, argnames, metrics), _PICKLED
+    return hookimpl, _function(hookimpl, plugin_manager, None, metrics), \
+        argnames
+
+
+def _compile(hookimpls, spec, plugin_manager=None, metrics=None):
+    """List of ``(hookimpl, function, argnames)`` tuples in call order.
+
+    Pass the ``plugin_manager`` to compile for the asynchronous call loops,
+    and ``metrics`` to record calls.
+
+    """
+    return [
+        _compile_one(hookimpl, spec, plugin_manager, metrics)
+        for hookimpl in reversed(hookimpls)
+    ]
+
+
+def _compile_groups(hookimpls, spec, plugin_manager=None, metrics=None):
+    """Priority groups, each split into its synchronous and asynchronous calls.
+
+    Empty priority groups are left out.
+
+    """
+    result = []
+    for group in _priority_groups(hookimpls):
+        if len(group) == 0:
+            continue
+        calls = _compile(group, spec, plugin_manager, metrics)
+        result.append((
+            [call for call in calls if not _is_async(call[0], plugin_manager)],
+            [call for call in calls if _is_async(call[0], plugin_manager)]
+        ))
+    return result
+
+
+def _wrapfail(generator, msg):
+    co = getattr(generator, 'gi_code', None) or generator.ag_code
+    return RuntimeError(
+        "wrap_controller at %r %s:%d %s" % (
+            co.co_name, co.co_filename, co.co_firstlineno, msg
+        )
+    )
+
+
+def _failed(causes):
+    return HookFailureException(
+        causes, "%d hook function(s) failed." % len(causes)
+    )
+
+
+def _call_all(sync_calls, caller_kwargs, retval, values=None,
+              fail_fast=False):
+    """Call ``sync_calls``, and append their results to ``retval``.
+
+    Results are :class:`~aiopluggy.Result` objects, or plain return values if
+    ``values`` is ``'raise'`` (the first exception is raised) or ``'return'``
+    (exceptions are appended, without their tracebacks).
+
+    With ``fail_fast``, the first exception ends the loop, and is raised in a
+    :exc:`~aiopluggy.HookFailureException`.
+
+    """
+    if fail_fast:
+        for hookimpl, function, argnames in sync_calls:
+            try:
+                result = function(**_project(caller_kwargs, argnames))
+            except Exception as e:
+                raise _failed([e]) from e
+            retval.append(result if values else Result(result))
+    elif values is None:
+        # Only the hook function in the try, not the (reducer's) append:
+        for hookimpl, function, argnames in sync_calls:
+            # noinspection PyBroadException
+            try:
+                result = Result(function(**_project(caller_kwargs, argnames)))
+            except Exception:
+                result = Result(exc_info=sys.exc_info())
+            retval.append(result)
+    elif values == 'raise':
+        for hookimpl, function, argnames in sync_calls:
+            retval.append(function(**_project(caller_kwargs, argnames)))
+    else:
+        for hookimpl, function, argnames in sync_calls:
+            try:
+                result = function(**_project(caller_kwargs, argnames))
+            except Exception as e:
+                result = e.with_traceback(None)
+            retval.append(result)
+
+
+_MISSING = object()
+
+_CALL_OPTIONS = {
+    # (first result, asynchronous): supported call options
+    (False, True): {'max_concurrency', 'deadline', 'values', 'fail_fast'},
+    (False, False): {'values', 'fail_fast'},
+    (True, True): {'deadline'},
+    (True, False): set(),
+}
+
+
+async def _cached(value):
+    return value
+
+
+def _task_result(task, values=None):
+    exception = task.exception()
+    if exception is None:
+        return task.result() if values else Result(task.result())
+    if values == 'raise':
+        raise exception
+    if values == 'return':
+        return exception.with_traceback(None)
+    return Result(exc_info=(
+        type(exception), exception, exception.__traceback__
+    ))
+
+
+def _timed_out(values=None):
+    exception = asyncio.TimeoutError("Hook call deadline passed.")
+    if values == 'raise':
+        raise exception
+    if values == 'return':
+        return exception
+    return Result(exc_info=(type(exception), exception, None))
+
+
+async def _gather(async_calls, caller_kwargs, retval, limit=None,
+                  deadline=None, values=None, fail_fast=False):
+    """Run ``async_calls``, and append their results to ``retval`` in order of
+    completion. See :func:`_call_all` for ``values`` and ``fail_fast``.
+
+    At most ``limit`` calls are in flight at any time. Calls that haven't
+    finished by ``deadline`` (in :meth:`loop.time()
+    <asyncio.AbstractEventLoop.time>`) are cancelled, and result in an
+    :exc:`asyncio.TimeoutError`.
+
+    Returns:
+        bool: ``False`` if the deadline passed.
+
+    """
+    loop = asyncio.get_event_loop()
+    pending = set()
+    calls = iter(async_calls)
+    try:  # <-- to cancel any unfinished tasks
+        while True:
+            for hookimpl, function, argnames in calls:
+                pending.add(asyncio.ensure_future(
+                    function(**_project(caller_kwargs, argnames))
+                ))
+                if limit is not None and len(pending) >= limit:
+                    break
+            if len(pending) == 0:
+                return True
+            timeout = None if deadline is None \
+                else max(deadline - loop.time(), 0)
+            done, pending = await asyncio.wait(
+                pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED
+            )
+            if fail_fast:
+                causes = [
+                    task.exception() for task in done
+                    if task.exception() is not None
+                ]
+                if causes:
+                    raise _failed(causes) from causes[0]
+            for task in done:
+                retval.append(_task_result(task, values))
+            if len(done) == 0:
+                if fail_fast:
+                    raise _failed([
+                        asyncio.TimeoutError("Hook call deadline passed.")
+                    ])
+                retval.extend(_timed_out(values) for _ in pending)
+                retval.extend(_timed_out(values) for _ in calls)
+                return False
+    finally:
+        for task in pending:
+            task.cancel()
+
+
+async def _race(async_calls, caller_kwargs, deadline=None):
+    """Run ``async_calls`` concurrently, and return the first result that is
+    not ``None``.
+
+    If several calls finish at once, the result of the first one in call order
+    wins. Unfinished calls are cancelled.
+
+    Raises:
+        asyncio.TimeoutError: if ``deadline`` passes first.
+
+    """
+    loop = asyncio.get_event_loop()
+    tasks = []
+    pending = set()
+    try:  # <-- to cancel any unfinished tasks
+        for hookimpl, function, argnames in async_calls:
+            tasks.append(asyncio.ensure_future(
+                function(**_project(caller_kwargs, argnames))
+            ))
+        pending = set(tasks)
+        while pending:
+            timeout = None if deadline is None \
+                else max(deadline - loop.time(), 0)
+            done, pending = await asyncio.wait(
+                pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED
+            )
+            if len(done) == 0:
+                raise asyncio.TimeoutError("Hook call deadline passed.")
+            for task in tasks:
+                if task in done:
+                    result = task.result()
+                    if result is not None:
+                        return result
+        return None
+    finally:
+        for task in tasks:
+            if not task.done():
+                task.cancel()
+
+
+class _CallPlan(object):
+    """Precompiled dispatch plan of a :class:`HookCaller`.
+
+    The plan only depends on the registered hook implementations and the hook
+    specification, so it is compiled once and reused by every call until
+    :meth:`HookCaller.add_hookimpl`, :meth:`HookCaller.remove_hookimpl` or
+    :meth:`HookCaller.set_spec` discards it.
+
+    """
+    def __init__(self, hook_caller):
+        spec = hook_caller.spec
+        pm = hook_caller.plugin_manager
+        self.metrics = metrics = pm.metrics
+        """:type: aiopluggy.metrics.Metrics"""
+        before = hook_caller.before
+        functions = hook_caller.functions
+        self.before = _compile(before, spec, None, metrics)
+        """Before-hooks in call order, for the synchronous call loops."""
+        self.before_groups = _compile_groups(before, spec, pm, metrics)
+        self.has_async_before = any(h.is_async for h in before)
+        self.in_process = any(h.is_in_process for h in before + functions)
+        """Asynchronous calls need :class:`_PicklingKwargs`."""
+        self.hookimpls = list(reversed(functions))
+        """Hook functions in call order."""
+        self.functions = _compile(functions, spec, None, metrics)
+        """Hook functions in call order, for the synchronous call loops."""
+        self.async_functions = _compile(functions, spec, pm, metrics)
+        """Hook functions in call order, for the asynchronous
+        ``first_notnone`` and ``first_only`` call loop."""
+        self.function_groups = _compile_groups(functions, spec, pm, metrics)
+        self.max_concurrency = None if spec is None \
+            else spec.options.get('bounded', {}).get('max_concurrency')
+        """Default maximum number of hook functions in flight per call."""
+        self.race = spec is not None and spec.is_race
+        self.reduce = None if spec is None or not spec.is_reduce \
+            else spec.options['reduce']
+        """Options of the ``reduce`` hookspec qualifier."""
+        self.values = spec.options['values'].get('errors', 'raise') \
+            if spec is not None and spec.is_values \
+            else 'raise' if self.reduce is not None else None
+        """Return plain values instead of :class:`~aiopluggy.Result` objects;
+        see :func:`_call_all`."""
+        self.fail_fast = spec is not None and spec.is_fail_fast
+        self.wrappers = [
+            (hookimpl, hookimpl.function, _projection(hookimpl, spec))
+            for hookimpl in reversed(hook_caller.wrappers)
+        ]
+        """Hook wrappers, outermost first."""
+
+
 class HookCaller(object):
     def __init__(self, name, plugin_manager):
         self.name = name
@@ -28,19 +459,78 @@ class HookCaller(object):
         """:type: list[aiopluggy.hooks.HookImpl]"""
         self.functions = []
         """:type: list[aiopluggy.hooks.HookImpl]"""
+        self.wrappers = []
+        """:type: list[aiopluggy.hooks.HookImpl]"""
+        self.lazy_plugins = []
+        """Plugins that implement this hook, but aren't imported yet. They
+        are imported when the plan is compiled."""
         self.spec = None
         """:type: aiopluggy.hooks.HookSpec"""
+        self._plan = None
+        """:type: _CallPlan"""
+        self.cache = None
+        """Results of a ``cached`` hook.
+
+        :type: aiopluggy.cache.ResultCache
+
+        """
+        self._valid_shapes = set()
+        """Sets of argument names that passed validation against ``spec``.
+
+        :type: set[frozenset[str]]
+
+        """
+        self.trusted = False
+        """Skip argument validation once a call has been validated.
+
+        Trusted callers promise to always call this hook with the same set of
+        arguments. After the first successful validation, calls are no longer
+        checked against the hook specification at all.
+
+        Calling a trusted hook with other arguments has undefined results per
+        hook function: functions that accept every argument in the
+        specification receive the caller's arguments unfiltered, and fail with
+        a :exc:`TypeError` (raised, or captured in their
+        :class:`~aiopluggy.Result`) on unknown arguments, while other
+        functions silently never see them.
+
+        """
 
     @property
     def plugin_manager(self):
         """:rtype: aiopluggy.PluginManager"""
         return self._plugin_manager()
 
+    @property
+    def plan(self):
+        """The compiled dispatch plan.
+
+        :rtype: _CallPlan
+
+        """
+        plan = self._plan
+        if plan is None:
+            if self.lazy_plugins:
+                self.plugin_manager._load_lazy_plugins(self)
+            plan = self._plan = _CallPlan(self)
+            if self.cache is not None:
+                # Hook functions were added or removed:
+                self.cache.clear()
+        return plan
+
+    def invalidate(self):
+        """Discard the compiled plan."""
+        self._plan = None
+
     def set_spec(self, namespace, flag_set):
         assert self.spec is None
         self.spec = HookSpec(namespace, self.name, flag_set)
-        for hookimpl in (self.before + self.functions):
+        for hookimpl in (self.before + self.functions + self.wrappers):
             hookimpl.validate_against(self.spec)
+        if self.spec.is_cached:
+            self.cache = ResultCache(**flag_set['cached'])
+        self._plan = None
+        self._valid_shapes.clear()
 
     def add_hookimpl(self, hookimpl):
         """A an implementation to the callback chain.
@@ -50,6 +540,8 @@ class HookCaller(object):
 
         if hookimpl.is_before:
             methods = self.before
+        elif hookimpl.is_wrapper:
+            methods = self.wrappers
         else:
             methods = self.functions
 
@@ -63,6 +555,21 @@ class HookCaller(object):
             while i >= 0 and methods[i].is_try_first:
                 i -= 1
             methods.insert(i + 1, hookimpl)
+        self._plan = None
+
+    def remove_hookimpl(self, hookimpl):
+        """Remove an implementation from the callback chain.
+
+        Calls in progress keep using the plan they started with.
+
+        """
+        if hookimpl.is_before:
+            self.before.remove(hookimpl)
+        elif hookimpl.is_wrapper:
+            self.wrappers.remove(hookimpl)
+        else:
+            self.functions.remove(hookimpl)
+        self._plan = None
 
     def __repr__(self):
         return "<HookCaller %r>" % (self.name,)
@@ -70,153 +577,539 @@ class HookCaller(object):
     def __call__(self, *args, **kwargs):
         if args:
             raise TypeError("hook calling supports only keyword arguments")
+        return self.call(kwargs)
+
+    def call(self, kwargs, **options):
+        """Call the hook with per-call options.
+
+        Args:
+            kwargs (dict): the hook arguments.
+            max_concurrency (int): maximum number of asynchronous hook
+                functions in flight during this call. Overrides the
+                ``max_concurrency`` option of the ``bounded`` hook
+                specification qualifier.
+            deadline (float): time, in :meth:`loop.time()
+                <asyncio.AbstractEventLoop.time>`, by which asynchronous hooks
+                must return. Unfinished hook functions are cancelled, and
+                result in an :exc:`asyncio.TimeoutError`: in their
+                :class:`~aiopluggy.Result` for parallel hooks, raised for
+                ``first_notnone`` and ``first_only`` hooks.
+            values (str): for parallel hooks, return a list of plain values
+                instead of :class:`~aiopluggy.Result` objects. With
+                ``'raise'``, the first exception is raised, and unfinished
+                hook functions are cancelled. With ``'return'``, exceptions
+                are part of the list, without their tracebacks. ``False``
+                returns :class:`~aiopluggy.Result` objects. Overrides the
+                ``values`` hook specification qualifier.
+            fail_fast (bool): for parallel hooks, cancel all unfinished hook
+                functions as soon as one raises an exception, and raise a
+                :exc:`~aiopluggy.HookFailureException`. Overrides the
+                ``fail_fast`` hook specification qualifier.
+
+        Raises:
+            TypeError: for an option that the hook doesn't support:
+                ``max_concurrency`` is for asynchronous parallel hooks,
+                ``deadline`` for asynchronous hooks, ``values`` and
+                ``fail_fast`` for parallel hooks.
+
+        """
         spec = self.spec
+        if options:
+            self._check_options(spec, options)
+        # Compiling the plan may register lazy plugins, and replay to them:
+        plan = self.plan
+        if spec is not None:
+            self._accept(spec, kwargs)
+        if self.cache is not None and not options:
+            key = self.cache.key(kwargs)
+            if key is not None:
+                return self._call_cached(spec, plan, kwargs, key)
+        if plan.wrappers:
+            return self._call_wrapped(spec, kwargs, options)
+        return self._dispatch(spec, kwargs, options)
+
+    def _call_cached(self, spec, plan, kwargs, key):
+        cache = self.cache
+        value = cache.get(key, _MISSING)
+        if value is not _MISSING:
+            return value if spec.is_sync else _cached(value)
+        generation = cache.generation
+        result = self._call_wrapped(spec, kwargs, {}) if plan.wrappers \
+            else self._dispatch(spec, kwargs, {})
+        if spec.is_sync:
+            cache.put(key, result, generation)
+            return result
+
+        async def store():
+            value = await result
+            cache.put(key, value, generation)
+            return value
+        return store()
+
+    def cache_info(self):
+        """Hit and miss statistics of a ``cached`` hook, like those of
+        :func:`functools.lru_cache`. Hits don't call any hook function.
+
+        :rtype: aiopluggy.cache.CacheInfo
+
+        """
+        if self.cache is None:
+            raise TypeError("Hook '%s' isn't cached." % self.name)
+        return self.cache.info()
+
+    def cache_clear(self):
+        """Forget the cached results of a ``cached`` hook."""
+        if self.cache is not None:
+            self.cache.clear()
+
+    def _check_options(self, spec, options):
+        """Raises :exc:`TypeError` for call options that this hook doesn't
+        support."""
+        first = spec is not None and \
+            (spec.is_first_notnone or spec.is_first_only)
+        is_async = spec is not None and not spec.is_sync
+        invalid = set(options) - _CALL_OPTIONS[first, is_async]
+        if invalid:
+            raise TypeError(
+                "Call option(s) %s not supported by %s%s hook '%s'." % (
+                    ', '.join(sorted(invalid)),
+                    'asynchronous' if is_async else 'synchronous',
+                    ' first result' if first else ' parallel', self.name
+                )
+            )
+
+    def _dispatch(self, spec, kwargs, options):
         if spec is None:
             return self._multicall_sync(
-                caller_kwargs=kwargs
+                caller_kwargs=kwargs, **options
             )
-        notinspec = set(kwargs.keys()) - spec.req_args - set(spec.opt_args.keys())
+        if spec.is_first_notnone or spec.is_first_only:
+            return self._multicall_first_sync(kwargs, spec.is_first_only, **options) \
+                if spec.is_sync \
+                else self._multicall_first_async(kwargs, spec.is_first_only, **options)
+        return self._multicall_sync(kwargs, **options) \
+            if spec.is_sync \
+            else self._multicall_async(kwargs, **options)
+
+    def stream(self, *args, **kwargs):
+        """Call a parallel, asynchronous hook, and iterate over the results as
+        they arrive::
+
+            async for result in pm.hooks.my_hook.stream(arg=1):
+                ...
+
+        Results arrive in priority group order, and in order of completion
+        within each group. Hook functions that are still running when the
+        iteration stops early are cancelled.
+
+        :rtype: ResultStream
+
+        """
+        if args:
+            raise TypeError("hook calling supports only keyword arguments")
+        spec = self.spec
+        if spec is None or spec.is_sync or \
+                spec.is_first_notnone or spec.is_first_only:
+            raise TypeError(
+                "Only parallel, asynchronous hooks can be streamed."
+            )
+        if self.plan.wrappers:
+            raise TypeError("Hooks with wrappers can't be streamed.")
+        self._accept(spec, kwargs)
+        return ResultStream(self, kwargs)
+
+    def map(self, iterable, concurrency=None, ordered=True):
+        """Call the hook once for each keyword arguments dictionary in
+        ``iterable``.
+
+        Calls are validated once per set of argument names, like any other
+        call. Synchronous hooks return a generator, that calls the hook as it
+        goes::
+
+            for results in pm.hooks.my_sync_hook.map(batch):
+                ...
+
+        Asynchronous hooks return an asynchronous iterator, that keeps up to
+        ``concurrency`` hook calls in flight (all of them by default)::
+
+            async for results in pm.hooks.my_hook.map(batch, concurrency=10):
+                ...
+
+        Each iteration yields the return value of one hook call: a list of
+        :class:`~aiopluggy.Result` objects, or a single value for
+        ``first_notnone`` and ``first_only`` hooks. Asynchronous hook calls
+        yield in input order by default, or in order of completion if
+        ``ordered`` is false.
+
+        Args:
+            concurrency (int): maximum number of asynchronous hook calls in
+                flight.
+            ordered (bool): yield asynchronous results in input order.
+
+        """
+        if concurrency is not None and concurrency < 1:
+            raise ValueError("concurrency must be at least 1")
+        spec = self.spec
+        if spec is None or spec.is_sync:
+            return (self.call(kwargs) for kwargs in iterable)
+        return MapStream(self, iterable, concurrency, ordered)
+
+    def _call_wrapped(self, spec, kwargs, options):
+        first = spec is not None and (
+            spec.is_first_notnone or spec.is_first_only
+        )
+        if spec is None or spec.is_sync:
+            return self._call_wrapped_sync(spec, kwargs, options, first)
+        return self._call_wrapped_async(spec, kwargs, options, first)
+
+    def _call_wrapped_sync(self, spec, kwargs, options, first):
+        """Call the hook inside its (synchronous) wrappers."""
+        teardowns = []
+        try:  # <-- to close the wrappers on errors
+            for hookimpl, function, argnames in self.plan.wrappers:
+                if hookimpl.is_async:
+                    raise TypeError(
+                        "%s: asynchronous hook wrapper in a synchronous hook "
+                        "call." % hookimpl
+                    )
+                gen = function(**_project(kwargs, argnames))
+                try:
+                    next(gen)  # first yield
+                except StopIteration:
+                    raise _wrapfail(gen, "did not yield") from None
+                teardowns.append(gen)
+            boxed = first
+            # noinspection PyBroadException
+            try:
+                outcome = self._dispatch(spec, kwargs, options)
+                if first:
+                    outcome = Result(outcome)
+            except Exception:
+                outcome = Result(exc_info=sys.exc_info())
+                boxed = True
+        except BaseException:
+            for gen in reversed(teardowns):
+                gen.close()
+            raise
+
+        # run all wrapper post-yield blocks
+        causes = []
+        for gen in reversed(teardowns):
+            try:
+                gen.send(outcome)
+            except StopIteration:
+                pass
+            except Exception as e:
+                causes.append(e)
+            else:
+                gen.close()
+                causes.append(_wrapfail(gen, "has second yield"))
+        if len(causes) > 0:
+            raise HookWrapperException(causes)
+        return outcome.value if boxed else outcome
+
+    async def _call_wrapped_async(self, spec, kwargs, options, first):
+        """Call the hook inside its wrappers."""
+        teardowns = []
+        try:  # <-- to close the wrappers on errors
+            for hookimpl, function, argnames in self.plan.wrappers:
+                gen = function(**_project(kwargs, argnames))
+                if hookimpl.is_async:
+                    try:
+                        await gen.__anext__()  # first yield
+                    except StopAsyncIteration:
+                        raise _wrapfail(gen, "did not yield") from None
+                else:
+                    try:
+                        next(gen)  # first yield
+                    except StopIteration:
+                        raise _wrapfail(gen, "did not yield") from None
+                teardowns.append((hookimpl.is_async, gen))
+            boxed = first
+            # noinspection PyBroadException
+            try:
+                outcome = await self._dispatch(spec, kwargs, options)
+                if first:
+                    outcome = Result(outcome)
+            except Exception:
+                outcome = Result(exc_info=sys.exc_info())
+                boxed = True
+        except BaseException:
+            for is_async, gen in reversed(teardowns):
+                if is_async:
+                    await gen.aclose()
+                else:
+                    gen.close()
+            raise
+
+        # run all wrapper post-yield blocks
+        causes = []
+        for is_async, gen in reversed(teardowns):
+            try:
+                if is_async:
+                    await gen.asend(outcome)
+                else:
+                    gen.send(outcome)
+            except (StopAsyncIteration, StopIteration):
+                pass
+            except Exception as e:
+                causes.append(e)
+            else:
+                if is_async:
+                    await gen.aclose()
+                else:
+                    gen.close()
+                causes.append(_wrapfail(gen, "has second yield"))
+        if len(causes) > 0:
+            raise HookWrapperException(causes)
+        return outcome.value if boxed else outcome
+
+    def _accept(self, spec, kwargs):
+        """Validate a call, and remember it if this is a replay hook."""
+        valid_shapes = self._valid_shapes
+        if not (self.trusted and valid_shapes):
+            shape = frozenset(kwargs)
+            if shape not in valid_shapes:
+                self._validate(shape)
+                valid_shapes.add(shape)
+        if spec.is_replay:
+            self.plugin_manager.history[self.name].append(kwargs)
+
+    def _validate(self, shape):
+        """Check a set of argument names against the hook specification.
+
+        Raises:
+            TypeError: if ``shape`` doesn't match the specification.
+
+        """
+        spec = self.spec
+        notinspec = shape - spec.argnames
         if notinspec:
             raise TypeError(
                 # TODO: show spec signature
-                "Argument(s) %s not declared in hookspec" % (notinspec,),
+                "Argument(s) %s not declared in hookspec" % (set(notinspec),),
             )
-        notincall = spec.req_args - set(kwargs.keys())
+        notincall = spec.req_args - shape
         if notincall:
             raise TypeError(
                 # TODO: show spec signature
                 "Missing required argument(s): %s" % (notincall,)
             )
-        if spec.is_replay:
-            self.plugin_manager.history.append((self.name, kwargs))
-        if spec.is_first_notnone or spec.is_first_only:
-            return self._multicall_first_sync(kwargs, spec.is_first_only) \
-                if spec.is_sync \
-                else self._multicall_first_async(kwargs, spec.is_first_only)
-        return self._multicall_sync(kwargs) \
-            if spec.is_sync \
-            else self._multicall_async(kwargs)
 
     def replay(self, function_, kwargs):
         return self._multicall_first_sync(
             kwargs, first_only=True, functions=[function_]
         )
 
-    async def _call_befores(self, caller_kwargs):
-        async def call_befores(hookimpl_group):
+    async def _call_befores(self, caller_kwargs, plan):
+        if plan.in_process:
+            caller_kwargs = _PicklingKwargs(caller_kwargs)
+
+        async def call_befores(sync_calls, async_calls):
+            for hookimpl, function, argnames in sync_calls:
+                function(**_project(caller_kwargs, argnames))
+            if len(async_calls) == 0:
+                return
             awaitables = []
             # noinspection PyBroadException
             try:  # <-- to cancel any unfinished awaitables
-                for hookimpl in reversed(hookimpl_group):
-                    kwargs = hookimpl.filtered_args(caller_kwargs)
-                    if hookimpl.is_async:
-                        awaitables.append(asyncio.ensure_future(
-                            hookimpl.function(**kwargs)
-                        ))
-                    else:
-                        hookimpl.function(**kwargs)
-                if len(awaitables) > 0:
-                    for f in asyncio.as_completed(awaitables):
-                        await f
-            except Exception:
+                for hookimpl, function, argnames in async_calls:
+                    awaitables.append(asyncio.ensure_future(
+                        function(**_project(caller_kwargs, argnames))
+                    ))
+                for f in asyncio.as_completed(awaitables):
+                    await f
+            except BaseException:
                 for a in awaitables:
                     if not a.done():
                         a.cancel()
                 raise
 
-        for group in _priority_groups(self.before):
-            await call_befores(group)
+        for sync_calls, async_calls in plan.before_groups:
+            await call_befores(sync_calls, async_calls)
 
-    def _call_befores_sync(self, caller_kwargs):
+    def _call_befores_sync(self, caller_kwargs, plan):
         # noinspection PyBroadException
-        for hookimpl in reversed(self.before):
-            kwargs = hookimpl.filtered_args(caller_kwargs)
-            hookimpl.function(**kwargs)
+        for hookimpl, function, argnames in plan.before:
+            function(**_project(caller_kwargs, argnames))
 
-    async def _multicall_async(self, caller_kwargs, functions=None):
+    async def _multicall_async(self, caller_kwargs, functions=None,
+                               max_concurrency=None, deadline=None,
+                               values=None, fail_fast=None, retval=None):
         """Execute a call into multiple python methods.
 
         ``caller_kwargs`` comes from HookCaller.__call__().
 
+        Results are appended to ``retval``, which is a new list by default.
+
         """
         # __tracebackhide__ = True
-        if functions is None:
-            functions = self.functions
-        await self.plugin_manager.await_unscheduled_coros()
-        await self._call_befores(caller_kwargs=caller_kwargs)
-        retval = []
+        plan = self.plan
+        if max_concurrency is None:
+            max_concurrency = plan.max_concurrency
+        if values is None:
+            values = plan.values
+        values = values or None
+        if fail_fast is None:
+            fail_fast = plan.fail_fast
+        groups = plan.function_groups if functions is None \
+            else _compile_groups(
+                functions, self.spec, self.plugin_manager, plan.metrics
+            )
+        replays = self.plugin_manager.replays
+        if replays.busy:
+            await replays.drain()
+        if plan.before_groups:
+            await self._call_befores(caller_kwargs, plan)
+        if _needs_pickling(plan, functions):
+            # Pickled after the before-hooks, which may change the arguments:
+            caller_kwargs = _PicklingKwargs(caller_kwargs)
+        if retval is None:
+            retval = [] if plan.reduce is None else _Reduction(plan.reduce)
 
-        async def multicall_parallel(hookimpl_group):
+        async def multicall_parallel(sync_calls, async_calls):
+            _call_all(sync_calls, caller_kwargs, retval, values, fail_fast)
+            if len(async_calls) == 0:
+                return True
+            if deadline is not None or fail_fast or \
+                    max_concurrency is not None and \
+                    len(async_calls) > max_concurrency:
+                return await _gather(
+                    async_calls, caller_kwargs, retval, limit=max_concurrency,
+                    deadline=deadline, values=values, fail_fast=fail_fast
+                )
             awaitables = []
-            # noinspection PyBroadException
             try:  # <-- to cancel any unfinished awaitables
-                for hookimpl in reversed(hookimpl_group):
-                    kwargs = hookimpl.filtered_args(caller_kwargs)
-                    if hookimpl.is_async:
-                        awaitables.append(hookimpl.function(**kwargs))
-                    else:
-                        # noinspection PyBroadException
-                        try:
-                            retval.append(Result(hookimpl.function(**kwargs)))
-                        except Exception:
-                            retval.append(Result(exc_info=sys.exc_info()))
-            except Exception:
-                for a in awaitables:
-                    asyncio.ensure_future(a).cancel()
-                raise
-            if len(awaitables) > 0:
+                for hookimpl, function, argnames in async_calls:
+                    awaitables.append(asyncio.ensure_future(
+                        function(**_project(caller_kwargs, argnames))
+                    ))
                 for f in asyncio.as_completed(awaitables):
+                    if values == 'raise':
+                        retval.append(await f)
+                        continue
                     # noinspection PyBroadException
                     try:
-                        retval.append(Result(await f))
-                    except Exception:
-                        retval.append(Result(exc_info=sys.exc_info()))
+                        result = await f
+                    except Exception as e:
+                        retval.append(
+                            Result(exc_info=sys.exc_info()) if values is None
+                            else e.with_traceback(None)
+                        )
+                    else:
+                        retval.append(
+                            Result(result) if values is None else result
+                        )
+            except BaseException:
+                # Also when this call is cancelled:
+                for a in awaitables:
+                    if not a.done():
+                        a.cancel()
+                raise
+            return True
 
-        for group in _priority_groups(functions):
-            await multicall_parallel(group)
+        in_time = True
+        for sync_calls, async_calls in groups:
+            if in_time and deadline is not None:
+                in_time = asyncio.get_event_loop().time() < deadline
+            if in_time:
+                in_time = await multicall_parallel(sync_calls, async_calls)
+            elif fail_fast:
+                raise _failed([
+                    asyncio.TimeoutError("Hook call deadline passed.")
+                ])
+            else:
+                retval.extend(
+                    _timed_out(values)
+                    for _ in range(len(sync_calls) + len(async_calls))
+                )
+        if isinstance(retval, _Reduction):
+            return retval.value
         return retval
 
-    def _multicall_sync(self, caller_kwargs, functions=None):
+    def _multicall_sync(self, caller_kwargs, functions=None, values=None,
+                        fail_fast=None):
         """Execute a call into multiple python methods.
 
         Called from :func:`HookCaller.__call__`.
 
         """
         # __tracebackhide__ = True
-        if functions is None:
-            functions = self.functions
-        self._call_befores_sync(caller_kwargs=caller_kwargs)
-        retval = []
-        for hookimpl in reversed(functions):
-            kwargs = hookimpl.filtered_args(caller_kwargs)
-            # noinspection PyBroadException
-            try:
-                retval.append(Result(hookimpl.function(**kwargs)))
-            except Exception:
-                retval.append(Result(exc_info=sys.exc_info()))
-        return retval
+        plan = self.plan
+        calls = plan.functions if functions is None \
+            else _compile(functions, self.spec, None, plan.metrics)
+        if values is None:
+            values = plan.values
+        if fail_fast is None:
+            fail_fast = plan.fail_fast
+        if plan.before:
+            self._call_befores_sync(caller_kwargs, plan)
+        if plan.reduce is None:
+            retval = []
+            _call_all(calls, caller_kwargs, retval, values or None, fail_fast)
+            return retval
+        retval = _Reduction(plan.reduce)
+        _call_all(calls, caller_kwargs, retval, values or None, fail_fast)
+        return retval.value
 
-    async def _multicall_first_async(self, caller_kwargs, first_only, functions=None):
+    async def _multicall_first_async(self, caller_kwargs, first_only,
+                                     functions=None, deadline=None):
         """Execute a call into multiple python methods.
 
         ``caller_kwargs`` comes from HookCaller.__call__().
 
+        Raises:
+            asyncio.TimeoutError: if ``deadline`` passes before a result is
+                found.
+
         """
         # __tracebackhide__ = True
-        if functions is None:
-            functions = self.functions
-        await self.plugin_manager.await_unscheduled_coros()
-        await self._call_befores(caller_kwargs=caller_kwargs)
-        for hookimpl in reversed(functions):
-            kwargs = hookimpl.filtered_args(caller_kwargs)
+        plan = self.plan
+        calls = plan.async_functions if functions is None \
+            else _compile(
+                functions, self.spec, self.plugin_manager, plan.metrics
+            )
+        replays = self.plugin_manager.replays
+        if replays.busy:
+            await replays.drain()
+        if plan.before_groups:
+            await self._call_befores(caller_kwargs, plan)
+        if _needs_pickling(plan, functions):
+            # Pickled after the before-hooks, which may change the arguments:
+            caller_kwargs = _PicklingKwargs(caller_kwargs)
+        if plan.race and functions is None and not first_only:
+            return await self._race_groups(caller_kwargs, plan, deadline)
+        loop = asyncio.get_event_loop()
+        for hookimpl, function, argnames in calls:
+            if deadline is not None and loop.time() >= deadline:
+                raise asyncio.TimeoutError("Hook call deadline passed.")
             # noinspection PyBroadException
-            result = hookimpl.function(**kwargs)
-            if hookimpl.is_async:
-                result = await result
+            result = function(**_project(caller_kwargs, argnames))
+            if _is_async(hookimpl, self.plugin_manager):
+                if deadline is None:
+                    result = await result
+                else:
+                    result = await asyncio.wait_for(
+                        result, deadline - loop.time()
+                    )
             if first_only or result is not None:
                 return result
         return None
 
+    async def _race_groups(self, caller_kwargs, plan, deadline):
+        """Race the asynchronous hook functions of each priority group, until
+        one of them returns a result other than ``None``."""
+        for sync_calls, async_calls in plan.function_groups:
+            for hookimpl, function, argnames in sync_calls:
+                result = function(**_project(caller_kwargs, argnames))
+                if result is not None:
+                    return result
+            if len(async_calls) > 0:
+                result = await _race(async_calls, caller_kwargs, deadline)
+                if result is not None:
+                    return result
+        return None
+
     def _multicall_first_sync(self, caller_kwargs, first_only, functions=None):
         """Execute a call into multiple python methods.
 
@@ -224,12 +1117,204 @@ class HookCaller(object):
 
         """
         # __tracebackhide__ = True
-        if functions is None:
-            functions = self.functions
-        self._call_befores_sync(caller_kwargs=caller_kwargs)
-        for hookimpl in reversed(functions):
-            kwargs = hookimpl.filtered_args(caller_kwargs)
-            result = hookimpl.function(**kwargs)
+        plan = self.plan
+        calls = plan.functions if functions is None \
+            else _compile(functions, self.spec, None, plan.metrics)
+        if plan.before:
+            self._call_befores_sync(caller_kwargs, plan)
+        for hookimpl, function, argnames in calls:
+            result = function(**_project(caller_kwargs, argnames))
             if first_only or result is not None:
                 return result
         return None
+
+
+class _Reduction(object):
+    """List-like sink for results, that folds them into :attr:`value` with the
+    options of the ``reduce`` hookspec qualifier."""
+    __slots__ = ('function', 'value')
+
+    def __init__(self, options):
+        self.function = options['function']
+        # A copy per call, for mutable initial values like {} or Counter():
+        self.value = copy.copy(options.get('initial'))
+
+    def append(self, result):
+        self.value = self.function(self.value, result)
+
+    def extend(self, results):
+        for result in results:
+            self.value = self.function(self.value, result)
+
+
+class _QueueSink(object):
+    """List-like sink for results, that feeds a queue."""
+    def __init__(self, queue):
+        self._queue = queue
+
+    def append(self, result):
+        self._queue.put_nowait(result)
+
+    def extend(self, results):
+        for result in results:
+            self._queue.put_nowait(result)
+
+
+async def _stream(hook_caller, kwargs, queue, done):
+    # Doesn't reference the ResultStream, so that it can be garbage collected
+    # while this runs.
+    try:
+        await hook_caller._multicall_async(kwargs, retval=_QueueSink(queue))
+    finally:
+        queue.put_nowait(done)
+
+
+class ResultStream(object):
+    """Asynchronous iterator over the :class:`~aiopluggy.Result` objects, or
+    the plain values (see the ``values`` hookspec qualifier), of a hook call,
+    returned by :meth:`HookCaller.stream`.
+
+    The call starts on the first iteration. Hook functions that are still
+    running are cancelled by :meth:`aclose`, when the stream is left as an
+    asynchronous context manager, or when the stream is garbage collected.
+
+    """
+    _DONE = object()
+
+    def __init__(self, hook_caller, kwargs):
+        self._hook_caller = hook_caller
+        self._kwargs = kwargs
+        self._queue = None
+        self._task = None
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if self._task is None:
+            self._queue = asyncio.Queue()
+            self._task = asyncio.ensure_future(_stream(
+                self._hook_caller, self._kwargs, self._queue, self._DONE
+            ))
+        result = await self._queue.get()
+        if result is self._DONE:
+            # Raises any exception from before-hooks or replays:
+            self._task.result()
+            raise StopAsyncIteration
+        return result
+
+    async def aclose(self):
+        """Cancel all unfinished hook functions."""
+        task = self._task
+        if task is not None and not task.done():
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.aclose()
+
+    def __del__(self):
+        task = self._task
+        if task is not None and not task.done():
+            task.cancel()
+
+
+class MapStream(object):
+    """Asynchronous iterator over the return values of a series of hook calls,
+    returned by :meth:`HookCaller.map`.
+
+    Hook calls are started as the iteration proceeds. Unfinished hook calls
+    are cancelled by :meth:`aclose`, when the stream is left as an
+    asynchronous context manager, when a hook call raises an exception, or when
+    the stream is garbage collected.
+
+    """
+    def __init__(self, hook_caller, iterable, concurrency=None, ordered=True):
+        self._hook_caller = hook_caller
+        self._kwargs = enumerate(iterable)
+        self._concurrency = concurrency
+        self._ordered = ordered
+        self._pending = set()
+        self._indexes = {}
+        """Indexes of the pending tasks into ``iterable``."""
+        self._finished = {} if ordered else collections.deque()
+        """Finished tasks, indexed by position if ``ordered``, otherwise in
+        order of completion."""
+        self._next = 0
+        """Position of the next result, if ``ordered``."""
+        self._exhausted = False
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        while True:
+            task = self._pop_finished()
+            if task is not None:
+                try:
+                    return task.result()
+                except BaseException:
+                    await self.aclose()
+                    raise
+            try:
+                self._start()
+            except BaseException:
+                await self.aclose()
+                raise
+            if len(self._pending) == 0:
+                raise StopAsyncIteration
+            done, self._pending = await asyncio.wait(
+                self._pending, return_when=asyncio.FIRST_COMPLETED
+            )
+            for task in done:
+                index = self._indexes.pop(task)
+                if self._ordered:
+                    self._finished[index] = task
+                else:
+                    self._finished.append(task)
+
+    def _pop_finished(self):
+        if not self._ordered:
+            return self._finished.popleft() if self._finished else None
+        task = self._finished.pop(self._next, None)
+        if task is not None:
+            self._next += 1
+        return task
+
+    def _start(self):
+        concurrency = self._concurrency
+        while not self._exhausted and (
+                concurrency is None or len(self._pending) < concurrency):
+            try:
+                index, kwargs = next(self._kwargs)
+            except StopIteration:
+                self._exhausted = True
+                break
+            task = asyncio.ensure_future(self._hook_caller.call(kwargs))
+            self._pending.add(task)
+            self._indexes[task] = index
+
+    async def aclose(self):
+        """Cancel all unfinished hook calls, and start no more."""
+        self._exhausted = True
+        pending, self._pending = self._pending, set()
+        for task in pending:
+            task.cancel()
+        if pending:
+            await asyncio.wait(pending)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.aclose()
+
+    def __del__(self):
+        for task in self._pending:
+            task.cancel()
@@ -1,4 +1,5 @@
 import inspect
+import pickle
 import warnings
 
 from .helpers import fqn
@@ -10,14 +11,96 @@ class HookCallError(Exception):
     """
 
 
+class HookWrapperException(Exception):
+    """ Wrapper for a set of exceptions raised during hook wrapper teardown.
+
+    .. :py:attribute:: causes
+
+        :type: List[Exception]
+
+    """
+    def __init__(self, causes, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.causes = causes
+
+
+class HookFailureException(Exception):
+    """ Wrapper for the exceptions that ended a ``fail_fast`` hook call.
+
+    .. :py:attribute:: causes
+
+        :type: List[Exception]
+
+    """
+    def __init__(self, causes, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.causes = causes
+
+
+def _flag_properties(marker_class):
+    """Class decorator that adds an ``is_<qualifier>`` property per qualifier
+    of ``marker_class``, backed by the bitmask in ``_flags``."""
+    def decorate(cls):
+        for name, bit in marker_class.BITS.items():
+            def is_set(self, bit=bit):
+                return self._flags & bit != 0
+            setattr(cls, 'is_' + name, property(
+                is_set, doc="Qualifier '%s' is set." % name
+            ))
+        return cls
+    return decorate
+
+
+@_flag_properties(HookspecMarker)
 class HookSpec(object):
+    __slots__ = ('namespace', 'name', 'function', '_flags', 'options',
+                 'req_args', 'opt_args', 'argnames')
+
     def __init__(self, namespace, name, flag_set):
         self.namespace = namespace
         self.name = name
         self.function = getattr(namespace, name)
-        self.is_first_notnone = self.is_first_only = self.is_replay = \
-            self.is_required = self.is_sync = False
-        self.__dict__.update(HookspecMarker.set2dict(flag_set))
+        self._flags = HookspecMarker.set2mask(flag_set)
+        if self.is_race and not self.is_first_notnone:
+            raise ValueError(
+                "%s.%s: Qualifier 'race' requires qualifier 'first_notnone'." %
+                (fqn(namespace), name)
+            )
+        for qualifier in ('values', 'fail_fast', 'reduce'):
+            if qualifier in flag_set and \
+                    (self.is_first_notnone or self.is_first_only):
+                raise ValueError(
+                    "%s.%s: Qualifier '%s' is for parallel hooks only." %
+                    (fqn(namespace), name, qualifier)
+                )
+        if self.is_values and flag_set['values'].get('errors', 'raise') \
+                not in {'raise', 'return'}:
+            raise ValueError(
+                "%s.%s: Option 'errors' must be 'raise' or 'return'." %
+                (fqn(namespace), name)
+            )
+        if self.is_cached and not \
+                (self.is_first_notnone or self.is_first_only):
+            raise ValueError(
+                "%s.%s: Qualifier 'cached' requires qualifier 'first_notnone' "
+                "or 'first_only'." % (fqn(namespace), name)
+            )
+        if self.is_cached and self.is_replay:
+            raise ValueError(
+                "%s.%s: Qualifier 'cached' can't be combined with 'replay'." %
+                (fqn(namespace), name)
+            )
+        if self.is_reduce and not callable(flag_set['reduce'].get('function')):
+            raise ValueError(
+                "%s.%s: Qualifier 'reduce' requires a callable 'function'." %
+                (fqn(namespace), name)
+            )
+        self.options = flag_set
+        """Qualifier options, indexed by qualifier name.
+
+        :type: dict[str, dict]
+
+        """
         self.__init_args()
 
     def __init_args(self):
@@ -40,6 +123,7 @@ class HookSpec(object):
             p.name: p.default for p in parameters
             if p.default is not inspect.Parameter.empty  # p.kind == inspect.Parameter.POSITIONAL_OR_KEYWORD
         }
+        self.argnames = frozenset(self.req_args).union(self.opt_args)
 
     def __str__(self):
         return "%s.%s%s" % (
@@ -52,46 +136,135 @@ class HookValidationError(Exception):
     """
 
 
+@_flag_properties(HookimplMarker)
 class HookImpl(object):
     _ALLOWED_PARAMETER_KINDS = {
         inspect.Parameter.POSITIONAL_ONLY,
         inspect.Parameter.POSITIONAL_OR_KEYWORD
     }
 
-    def __init__(self, plugin, name, flag_set):
+    __slots__ = ('plugin', 'name', 'function', '_flags', 'options',
+                 'is_async', 'timeout', 'semaphore', 'process_target',
+                 'req_args', 'opt_args', 'argnames')
+
+    def __init__(self, plugin, name, flag_set, args=None):
+        """
+        Args:
+            args: the result of :meth:`parse_args` for this function, if
+                known already.
+
+        """
         self.plugin = plugin
         self.name = name
         self.function = getattr(plugin, name)
-        self.is_try_first = self.is_try_last = self.is_dont_await = self.is_before = False
-        self.__dict__.update(HookimplMarker.set2dict(flag_set))
+        self._flags = HookimplMarker.set2mask(flag_set)
+        self.options = flag_set
+        """Qualifier options, indexed by qualifier name.
+
+        :type: dict[str, dict]
+
+        """
         # noinspection PyUnresolvedReferences
         self.is_async = (inspect.iscoroutinefunction(self.function) and
                          not self.is_dont_await)
-        self.__init_args()
+        if self.is_wrapper:
+            self.__init_wrapper()
+        self.timeout = flag_set['timeout'].get('seconds') \
+            if self.is_timeout else None
+        """Seconds after which a call to this function is cancelled."""
+        if self.is_in_thread and inspect.iscoroutinefunction(self.function):
+            raise ValueError(
+                "%s.%s: Only synchronous hook functions can run in a thread." %
+                (fqn(plugin), name)
+            )
+        self.process_target = None
+        """Module name or pickled plugin, to find this hook function in a
+        worker process."""
+        if self.is_in_process:
+            self.__init_process_target()
+        if self.timeout is not None and not (
+                self.is_async or self.is_in_thread or self.is_in_process):
+            raise ValueError(
+                "%s.%s: Only asynchronous hook functions can have a timeout." %
+                (fqn(plugin), name)
+            )
+        self.semaphore = None
+        """Limits the concurrency of the plugin, if set.
 
-    def __init_args(self):
-        signature = inspect.signature(self.function)
+        :type: aiopluggy.helpers.LazySemaphore
+
+        """
+        if args is None:
+            args = self.parse_args(plugin, name, self.function)
+        self.req_args, self.opt_args, self.argnames = args
+
+    def __init_wrapper(self):
+        if inspect.isasyncgenfunction(self.function):
+            self.is_async = True
+        elif not inspect.isgeneratorfunction(self.function):
+            raise ValueError(
+                "%s.%s: Hook wrappers must be generator functions." %
+                (fqn(self.plugin), self.name)
+            )
+        if self.is_before or self.is_in_thread or self.is_in_process:
+            raise ValueError(
+                "%s.%s: Hook wrappers can't be 'before', 'in_thread' or "
+                "'in_process'." % (fqn(self.plugin), self.name)
+            )
+
+    def __init_process_target(self):
+        if inspect.iscoroutinefunction(self.function):
+            raise ValueError(
+                "%s.%s: Only synchronous hook functions can run in a process." %
+                (fqn(self.plugin), self.name)
+            )
+        if inspect.ismodule(self.plugin):
+            self.process_target = self.plugin.__name__
+            return
+        try:
+            # Classes pickle by reference, instances by class and state:
+            self.process_target = pickle.dumps(
+                self.plugin, pickle.HIGHEST_PROTOCOL
+            )
+        except Exception as e:
+            raise ValueError(
+                "%s.%s: Only picklable plugins can run in a process: %s" %
+                (fqn(self.plugin), self.name, e)
+            ) from None
+
+    @staticmethod
+    def parse_args(plugin, name, function):
+        """Parse the signature of a hook function.
+
+        Returns:
+            tuple: the required argument names, a dictionary of default values
+            indexed by optional argument name, and a frozenset of all argument
+            names.
+
+        """
+        signature = inspect.signature(function)
         parameters = list(signature.parameters.values())
         if any(parameter.kind != inspect.Parameter.POSITIONAL_OR_KEYWORD  # not in self._ALLOWED_PARAMETER_KINDS
                for parameter in parameters):
             raise ValueError(
                 "%s.%s%s: Only positional arguments allowed "
                 "for hook specifications." %
-                (fqn(self.plugin), self.name, signature)
+                (fqn(plugin), name, signature)
             )
-        self.req_args = {
+        req_args = {
             p.name for p in parameters
             if p.default is inspect.Parameter.empty  # p.kind == inspect.Parameter.POSITIONAL_ONLY
         }
-        self.opt_args = {
+        opt_args = {
             p.name: p.default for p in parameters
             if p.default is not inspect.Parameter.empty  # p.kind == inspect.Parameter.POSITIONAL_OR_KEYWORD
         }
+        return req_args, opt_args, frozenset(req_args).union(opt_args)
 
     def filtered_args(self, kwargs):
         return {
             name: value for (name, value) in kwargs.items()
-            if name in self.req_args or name in self.opt_args
+            if name in self.argnames
         }
 
     def validate_against(self, spec: HookSpec):
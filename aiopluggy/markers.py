@@ -1,16 +1,99 @@
-class HookspecMarker(object):
+def _bits(qualifiers):
+    """Bit per qualifier name, for packing qualifiers into an int."""
+    return {name: 1 << i for i, name in enumerate(sorted(qualifiers))}
+
+
+class _Marker(object):
+    """ Common base class of :class:`HookspecMarker` and :class:`HookimplMarker`.
+
+    A marker holds its qualifiers in :attr:`flags`: a dictionary that maps
+    each qualifier name to a (possibly empty) dictionary of qualifier options.
+    Options are given by calling a marker with keyword arguments only, and
+    apply to the qualifier added last::
+
+        @hookspec.replay(maxlen=100)
+        def my_hook(arg):
+            pass
+
+    """
+    QUALIFIERS = set()
+    BITS = {}
+    """Bit per qualifier, see :meth:`set2mask`."""
+    OPTIONS = {}
+    """Option names allowed per qualifier."""
+    MARKER = None
+    """Format of the name of the attribute set on marked functions."""
+
+    def __init__(self, project_name, flags=None, qualifier=None):
+        if flags is None:
+            flags = {}
+        self.project_name = project_name
+        self.flags = flags
+        self._qualifier = qualifier
+        self._marker = self.MARKER % project_name
+
+    def __call__(self, func=None, **options):
+        if func is None:
+            return self._with_options(options)
+        if options:
+            raise TypeError(
+                "Qualifier options and function can not be passed together."
+            )
+        setattr(func, self._marker, self.flags)
+        return func
+
+    def _with_flag(self, name):
+        if name not in self.QUALIFIERS:
+            raise AttributeError(name)
+        flags = dict(self.flags)
+        flags.setdefault(name, {})
+        return self.__class__(self.project_name, flags, name)
+
+    def _with_options(self, options):
+        name = self._qualifier
+        if name is None:
+            raise TypeError("Qualifier options must follow a qualifier.")
+        unknown = set(options) - self.OPTIONS.get(name, set())
+        if unknown:
+            raise TypeError(
+                "Qualifier %r doesn't take option(s) %s" % (name, unknown)
+            )
+        flags = dict(self.flags)
+        flags[name] = dict(flags[name], **options)
+        return self.__class__(self.project_name, flags, name)
+
+    @classmethod
+    def set2mask(cls, s):
+        """Pack the qualifier names in ``s`` into an int bitmask."""
+        mask = 0
+        for name in s:
+            mask |= cls.BITS[name]
+        return mask
+
+
+class HookspecMarker(_Marker):
     """ Decorator helper class for marking functions as hook specifications.
 
     You can instantiate it with a project_name to get a decorator.
     Calling PluginManager.register_specs later will discover all marked functions
     if the PluginManager uses the same project_name.
     """
-    QUALIFIERS = {'first_notnone', 'first_only', 'replay', 'sync', 'required'}
+    QUALIFIERS = {'first_notnone', 'first_only', 'replay', 'sync', 'required',
+                  'bounded', 'race', 'values', 'fail_fast', 'reduce',
+                  'cached'}
+    BITS = _bits(QUALIFIERS)
+    OPTIONS = {
+        'replay': {'maxlen', 'key', 'ttl', 'weak'},
+        'bounded': {'max_concurrency'},
+        'values': {'errors'},
+        'reduce': {'function', 'initial'},
+        'cached': {'maxsize', 'ttl'},
+    }
+    MARKER = '_pluggy_%s_spec'
 
-    def __init__(self, project_name, flags=None):
-        if flags is None:
-            flags = set()
-        if {'first_only', 'first_notnone'} <= flags:
+    def __init__(self, project_name, flags=None, qualifier=None):
+        super().__init__(project_name, flags, qualifier)
+        if {'first_only', 'first_notnone'} <= self.flags.keys():
             # Normally, this condition should raise a ValueError, because the
             # value of a parameter (flags) is illegal. Instead, we raise
             # AttributeError because, from a user perspective, this Exception is
@@ -19,13 +102,19 @@ class HookspecMarker(object):
             raise AttributeError(
                 "Qualifiers 'first_notnone' and 'first_only' are incompatible"
             )
-        self.project_name = project_name
-        self.specmarker = '_pluggy_%s_spec' % project_name
-        self.flags = flags
+        self.specmarker = self._marker
 
-    def __call__(self, func):
-        setattr(func, self.specmarker, self.flags)
-        return func
+    @property
+    def bounded(self):
+        """Bound the number of asynchronous hook functions in flight per call.
+
+        Options:
+
+        -   ``max_concurrency``: the maximum number of asynchronous hook
+            functions that run concurrently within one hook call.
+
+        """
+        return self._with_flag('bounded')
 
     @property
     def first_notnone(self):
@@ -35,8 +124,34 @@ class HookspecMarker(object):
     def first_only(self):
         return self._with_flag('first_only')
 
+    @property
+    def race(self):
+        """Run the asynchronous hook functions of a ``first_notnone`` hook
+        concurrently, per priority group.
+
+        The first result other than ``None`` wins, and the hook functions that
+        are still running are cancelled. If several hook functions finish at
+        once, the first one in call order wins.
+
+        """
+        return self._with_flag('race')
+
     @property
     def replay(self):
+        """Remember calls, and replay them to late registered hook functions.
+
+        Options:
+
+        -   ``maxlen``: remember at most this many calls;
+        -   ``key``: name of a hook argument, or a callable that takes the
+            call's keyword arguments dictionary. Only the latest call per key
+            is remembered;
+        -   ``ttl``: forget calls after this many seconds;
+        -   ``weak``: hold argument values by weak reference, where possible.
+            A call is forgotten once any of its weakly held values is garbage
+            collected.
+
+        """
         return self._with_flag('replay')
 
     @property
@@ -47,20 +162,65 @@ class HookspecMarker(object):
     def sync(self):
         return self._with_flag('sync')
 
-    def _with_flag(self, name):
-        if name not in self.QUALIFIERS:
-            raise AttributeError(name)
-        flags = self.flags.union({name})
-        return HookspecMarker(self.project_name, flags)
+    @property
+    def values(self):
+        """Return a list of plain values from parallel hook calls, instead of
+        :class:`~aiopluggy.Result` objects.
 
-    @classmethod
-    def set2dict(cls, s):
-        return {
-            ('is_' + name): (name in s) for name in cls.QUALIFIERS
-        }
+        Options:
 
+        -   ``errors``: ``'raise'`` (the default) raises the first exception,
+            and cancels the unfinished hook functions. ``'return'`` puts
+            exceptions in the list, without their tracebacks.
 
-class HookimplMarker(object):
+        """
+        return self._with_flag('values')
+
+    @property
+    def fail_fast(self):
+        """Cancel all unfinished hook functions of a parallel hook call as
+        soon as one of them raises an exception, skip the later priority
+        groups, and raise a :exc:`~aiopluggy.HookFailureException`.
+        """
+        return self._with_flag('fail_fast')
+
+    @property
+    def reduce(self):
+        """Fold the results of a parallel hook call, as they arrive, into a
+        single return value.
+
+        Options:
+
+        -   ``function``: called as ``function(accumulated, result)``, returns
+            the new accumulated value.
+        -   ``initial``: the initial accumulated value, copied per call.
+            Defaults to ``None``.
+
+        Results are plain values, and exceptions are raised, unless the
+        ``values`` qualifier says otherwise.
+
+        """
+        return self._with_flag('reduce')
+
+    @property
+    def cached(self):
+        """Cache the results of a ``first_notnone`` or ``first_only`` hook,
+        indexed by call arguments.
+
+        Options:
+
+        -   ``maxsize``: remember at most this many results, least recently
+            used first out. Defaults to 128; ``None`` means unbounded.
+        -   ``ttl``: forget results after this many seconds.
+
+        The cache is cleared when hook functions are added or removed. Calls
+        with unhashable arguments, or with call options, aren't cached.
+
+        """
+        return self._with_flag('cached')
+
+
+class HookimplMarker(_Marker):
     # language=rst
     """ Decorator helper class for marking functions as hook implementations.
 
@@ -69,22 +229,21 @@ class HookimplMarker(object):
     if the PluginManager uses the same project_name.
     """
 
-    QUALIFIERS = {'try_first', 'try_last', 'dont_await', 'before'}
+    QUALIFIERS = {'try_first', 'try_last', 'dont_await', 'before', 'timeout',
+                  'in_thread', 'in_process', 'wrapper'}
+    BITS = _bits(QUALIFIERS)
+    OPTIONS = {
+        'timeout': {'seconds'},
+    }
+    MARKER = '_pluggy_%s_impl'
 
-    def __init__(self, project_name, flags=None):
-        if flags is None:
-            flags = set()
-        if {'try_first', 'try_last'} <= flags:
+    def __init__(self, project_name, flags=None, qualifier=None):
+        super().__init__(project_name, flags, qualifier)
+        if {'try_first', 'try_last'} <= self.flags.keys():
             raise AttributeError(
                 "Hook can not be both 'try_first' and 'try_last'."
             )
-        self.project_name = project_name
-        self.implmarker = '_pluggy_%s_impl' % project_name
-        self.flags = flags
-
-    def __call__(self, func):
-        setattr(func, self.implmarker, self.flags)
-        return func
+        self.implmarker = self._marker
 
     @property
     def before(self):
@@ -94,6 +253,63 @@ class HookimplMarker(object):
     def dont_await(self):
         return self._with_flag('dont_await')
 
+    @property
+    def in_process(self):
+        """Run this CPU-bound, synchronous hook function in a worker process,
+        when called by an asynchronous hook.
+
+        Workers are taken from the plugin manager's
+        :attr:`~aiopluggy.PluginManager.process_executor`. The worker finds
+        the function by the name of its plugin module, or by unpickling its
+        plugin class or instance, as it was at registration. The caller
+        arguments and the return value must be picklable; the arguments are
+        pickled once per hook call.
+
+        """
+        return self._with_flag('in_process')
+
+    @property
+    def in_thread(self):
+        """Run this blocking, synchronous hook function in a thread, when
+        called by an asynchronous hook.
+
+        The thread is taken from the plugin manager's
+        :attr:`~aiopluggy.PluginManager.executor`, and the hook caller awaits
+        the function alongside the asynchronous hook functions.
+        Synchronous hooks still call the function directly.
+
+        """
+        return self._with_flag('in_thread')
+
+    @property
+    def timeout(self):
+        """Cancel calls to this asynchronous hook function after some time.
+
+        Options:
+
+        -   ``seconds``: the timeout. A cancelled call results in an
+            :exc:`asyncio.TimeoutError`.
+
+        """
+        return self._with_flag('timeout')
+
+    @property
+    def wrapper(self):
+        """Wrap all other hook functions of a hook call.
+
+        A wrapper is a generator function, or an asynchronous generator
+        function for asynchronous hooks, with a single ``yield``. The hook
+        call happens at the ``yield``, which evaluates to what the call
+        returns: a list of :class:`~aiopluggy.Result` objects, a list of plain
+        values for ``values`` hooks, or the accumulated value for ``reduce``
+        hooks. For ``first_notnone`` and ``first_only`` hooks, and whenever
+        the call raises an exception, it evaluates to a single
+        :class:`~aiopluggy.Result` instead. Wrappers can change the results
+        by setting :attr:`Result.value <aiopluggy.Result.value>`.
+
+        """
+        return self._with_flag('wrapper')
+
     @property
     def try_first(self):
         return self._with_flag('try_first')
@@ -101,15 +317,3 @@ class HookimplMarker(object):
     @property
     def try_last(self):
         return self._with_flag('try_last')
-
-    def _with_flag(self, name):
-        if name not in self.QUALIFIERS:
-            raise AttributeError()
-        flags = self.flags.union({name})
-        return HookimplMarker(self.project_name, flags)
-
-    @classmethod
-    def set2dict(cls, s):
-        return {
-            ('is_' + name): (name in s) for name in cls.QUALIFIERS
-        }
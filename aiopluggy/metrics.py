@@ -0,0 +1,255 @@
+""" Call counts, exception counts and latency histograms of hooks and hook
+functions; see :meth:`aiopluggy.PluginManager.enable_metrics`.
+"""
+import asyncio
+import bisect
+import functools
+import inspect
+import time
+
+from .helpers import fqn
+
+
+DEFAULT_BUCKETS = (
+    .0001, .00025, .0005, .001, .0025, .005, .01, .025, .05, .1, .25, .5,
+    1.0, 2.5, 5.0, 10.0
+)
+"""Upper bounds, in seconds, of the latency histogram buckets."""
+
+
+class Stats(object):
+    """Call count, exception count and latency histogram of a single hook or
+    hook function."""
+    __slots__ = ('buckets', 'counts', 'calls', 'exceptions', 'seconds')
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        """Number of calls per bucket; the last one is unbounded."""
+        self.calls = 0
+        self.exceptions = 0
+        self.seconds = 0.0
+        """Total latency."""
+
+    def observe(self, seconds, failed=False):
+        self.calls += 1
+        if failed:
+            self.exceptions += 1
+        self.seconds += seconds
+        self.counts[bisect.bisect_left(self.buckets, seconds)] += 1
+
+    def snapshot(self):
+        """A dictionary of plain values, with cumulative bucket counts indexed
+        by upper bound (as a string, ``'+Inf'`` for the last bucket)."""
+        buckets = {}
+        count = 0
+        for bound, bucket_count in zip(self.buckets + (float('inf'),),
+                                       self.counts):
+            count += bucket_count
+            buckets[_format_bound(bound)] = count
+        return {
+            'calls': self.calls,
+            'exceptions': self.exceptions,
+            'seconds': self.seconds,
+            'buckets': buckets,
+        }
+
+
+def _format_bound(bound):
+    return '+Inf' if bound == float('inf') else repr(float(bound))
+
+
+def metered(stats, function, is_async):
+    """Wrap ``function`` to record its calls in ``stats``.
+
+    ``is_async`` tells if ``function`` returns an awaitable.
+
+    """
+    clock = time.perf_counter
+    if is_async:
+        @functools.wraps(function)
+        async def metered_async(**kwargs):
+            start = clock()
+            try:
+                result = await function(**kwargs)
+            except BaseException:
+                stats.observe(clock() - start, True)
+                raise
+            stats.observe(clock() - start)
+            return result
+        return metered_async
+
+    @functools.wraps(function)
+    def metered_sync(**kwargs):
+        start = clock()
+        try:
+            result = function(**kwargs)
+        except BaseException:
+            stats.observe(clock() - start, True)
+            raise
+        stats.observe(clock() - start)
+        return result
+    return metered_sync
+
+
+def metered_call(stats, call):
+    """Wrap :meth:`HookCaller.call <aiopluggy.hook_caller.HookCaller.call>`
+    to record whole hook calls in ``stats``."""
+    clock = time.perf_counter
+
+    async def finish(coro, start):
+        try:
+            result = await coro
+        except BaseException:
+            stats.observe(clock() - start, True)
+            raise
+        stats.observe(clock() - start)
+        return result
+
+    @functools.wraps(call)
+    def metered_hook_call(kwargs, **options):
+        start = clock()
+        try:
+            result = call(kwargs, **options)
+        except BaseException:
+            stats.observe(clock() - start, True)
+            raise
+        if asyncio.iscoroutine(result):
+            return finish(result, start)
+        stats.observe(clock() - start)
+        return result
+    return metered_hook_call
+
+
+class Metrics(object):
+    """Collected :class:`Stats`, per hook and per hook function.
+
+    Args:
+        buckets: upper bounds, in seconds, of the latency histogram buckets.
+
+    """
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        self.hooks = {}
+        """:type: dict[str, Stats]"""
+        self.hookimpls = {}
+        """Indexed by hook name, and then by plugin name: the name of the
+        module or class, so that all instances of a plugin class share their
+        statistics, and per-connection plugins don't add series.
+
+        :type: dict[str, dict[str, Stats]]
+
+        """
+
+    def hook(self, name):
+        """The :class:`Stats` of the hook called ``name``."""
+        stats = self.hooks.get(name)
+        if stats is None:
+            stats = self.hooks[name] = Stats(self.buckets)
+        return stats
+
+    def hookimpl(self, hookimpl):
+        """The :class:`Stats` of a hook function."""
+        per_plugin = self.hookimpls.setdefault(hookimpl.name, {})
+        plugin = hookimpl.plugin
+        plugin_name = fqn(
+            plugin if inspect.ismodule(plugin) or inspect.isclass(plugin)
+            else type(plugin)
+        )
+        stats = per_plugin.get(plugin_name)
+        if stats is None:
+            stats = per_plugin[plugin_name] = Stats(self.buckets)
+        return stats
+
+    def reset(self):
+        """Zero all counts."""
+        for stats in self._all_stats():
+            stats.__init__(self.buckets)
+
+    def _all_stats(self):
+        yield from self.hooks.values()
+        for per_plugin in self.hookimpls.values():
+            yield from per_plugin.values()
+
+    def snapshot(self):
+        """All statistics, as a dictionary of plain values::
+
+            {
+                'hooks': {hook_name: stats},
+                'hookimpls': {hook_name: {plugin_name: stats}},
+            }
+
+        See :meth:`Stats.snapshot` for the format of ``stats``.
+
+        """
+        return {
+            'hooks': {
+                name: stats.snapshot() for name, stats in self.hooks.items()
+            },
+            'hookimpls': {
+                name: {
+                    plugin_name: stats.snapshot()
+                    for plugin_name, stats in per_plugin.items()
+                }
+                for name, per_plugin in self.hookimpls.items()
+            },
+        }
+
+    def render_prometheus(self, prefix='aiopluggy'):
+        """All statistics, in the Prometheus text exposition format."""
+        lines = []
+        hooks = sorted(
+            (({'hook': name}, stats) for name, stats in self.hooks.items()),
+            key=lambda item: item[0]['hook']
+        )
+        hookimpls = sorted(
+            (({'hook': name, 'plugin': plugin_name}, stats)
+             for name, per_plugin in self.hookimpls.items()
+             for plugin_name, stats in per_plugin.items()),
+            key=lambda item: (item[0]['hook'], item[0]['plugin'])
+        )
+        for kind, series in (('hook', hooks), ('hookimpl', hookimpls)):
+            name = '%s_%s' % (prefix, kind)
+            _render_counter(
+                lines, name + '_calls_total', "Number of calls.",
+                ((labels, stats.calls) for labels, stats in series)
+            )
+            _render_counter(
+                lines, name + '_exceptions_total',
+                "Number of calls that raised an exception.",
+                ((labels, stats.exceptions) for labels, stats in series)
+            )
+            _render_histogram(
+                lines, name + '_duration_seconds', "Call latency.", series
+            )
+        return ''.join(line + '\n' for line in lines)
+
+
+def _escape(value):
+    return value.replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _labels(labels):
+    return '{%s}' % ','.join(
+        '%s="%s"' % (name, _escape(str(value)))
+        for name, value in sorted(labels.items())
+    )
+
+
+def _render_counter(lines, name, help_text, series):
+    lines.append('# HELP %s %s' % (name, help_text))
+    lines.append('# TYPE %s counter' % name)
+    for labels, value in series:
+        lines.append('%s%s %d' % (name, _labels(labels), value))
+
+
+def _render_histogram(lines, name, help_text, series):
+    lines.append('# HELP %s %s' % (name, help_text))
+    lines.append('# TYPE %s histogram' % name)
+    for labels, stats in series:
+        for bound, count in stats.snapshot()['buckets'].items():
+            lines.append('%s_bucket%s %d' % (
+                name, _labels(dict(labels, le=bound)), count
+            ))
+        lines.append('%s_sum%s %r' % (name, _labels(labels), stats.seconds))
+        lines.append('%s_count%s %d' % (name, _labels(labels), stats.calls))
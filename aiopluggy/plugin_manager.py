@@ -1,9 +1,46 @@
+import asyncio
+import concurrent.futures
+import heapq
 import inspect
+import sys
 import warnings
+import weakref
 
-from .helpers import fqn
+from .helpers import LazySemaphore, fqn
 from .hooks import HookImpl
 from .hook_caller import HookCaller
+from .blocking import BlockingDetector
+from .metrics import DEFAULT_BUCKETS, Metrics, metered_call
+from .tracing import Tracer, monitored_call
+from .replay import ReplayHistory, ReplayScheduler
+
+
+def _entry_points(group):
+    try:
+        from importlib import metadata
+    except ImportError:  # Python < 3.8
+        import pkg_resources
+        return list(pkg_resources.iter_entry_points(group))
+    entry_points = metadata.entry_points()
+    if hasattr(entry_points, 'select'):
+        return list(entry_points.select(group=group))
+    return list(entry_points.get(group, ()))
+
+
+_discovered = weakref.WeakKeyDictionary()
+"""Hook functions of plugin classes, for the registration of their instances.
+
+Indexed by class, and then by marker name; see
+:meth:`PluginManager._discover_hookimpls`.
+
+"""
+
+
+class _LazyPlugin(object):
+    """An entry point that is loaded on first use of one of its hooks."""
+    def __init__(self, entry_point, hook_names):
+        self.entry_point = entry_point
+        self.hook_names = hook_names
 
 
 class PluginManager(object):
@@ -17,24 +54,229 @@ class PluginManager(object):
     plugin objects.
 
     For debugging purposes you can call ``enable_tracing()``
-    which will subsequently send debug information to the trace helper.
+    which will subsequently write a line before and after each hook call.
     """
 
     class _Namespace(object):
         pass
 
-    def __init__(self, project_name):
+    def __init__(self, project_name, replay_concurrency=None,
+                 plugin_concurrency=None, executor=None,
+                 process_executor=None):
         self.project_name = project_name
         self.implmarker = '_pluggy_%s_impl' % project_name
         self.specmarker = '_pluggy_%s_spec' % project_name
         self.hooks = self._Namespace()
         self.registered_plugins = set()
-        self.history = []  # list of (name, kwargs) tuples in historic order.
-        self.replay_to = {}  # HookImpl objects, indexed by name
-        self.unscheduled_coros = []
-        """:type: list(tuple(aiopluggy.hooks.HookImpl, Coroutine))"""
+        self.hookimpls = {}
+        """Hook functions, indexed by plugin name.
+
+        :type: dict[str, list[aiopluggy.hooks.HookImpl]]
+
+        """
+        self.history = {}
+        """Past calls of replay hooks, indexed by hook name.
+
+        :type: dict[str, aiopluggy.replay.ReplayHistory]
+
+        """
+        self.replay_to = {}  # lists of HookImpl objects, indexed by name
         self.unhandled_exceptions = []
         """:type: list(tuple(aiopluggy.hooks.HookImpl, Exception))"""
+        self.replays = ReplayScheduler(
+            self.unhandled_exceptions, max_concurrency=replay_concurrency
+        )
+        """Asynchronous replays, deferred until the next asynchronous hook
+        call. At most ``replay_concurrency`` replays run concurrently.
+
+        :type: aiopluggy.replay.ReplayScheduler
+
+        """
+        self.plugin_concurrency = plugin_concurrency
+        """Default maximum number of concurrently running asynchronous hook
+        functions per plugin, across all hooks and calls. ``None`` means no
+        limit."""
+        self.plugin_semaphores = {}
+        """Concurrency limits, indexed by plugin name.
+
+        :type: dict[str, aiopluggy.helpers.LazySemaphore]
+
+        """
+        self._executor = executor
+        self._process_executor = process_executor
+        self.metrics = None
+        """Collected metrics, if enabled by :meth:`enable_metrics`.
+
+        :type: aiopluggy.metrics.Metrics
+
+        """
+        self._hookcall_monitors = []
+        self.blocking_detector = None
+        """Times synchronous hook functions on the event loop, if enabled by
+        :meth:`enable_blocking_detector`.
+
+        :type: aiopluggy.blocking.BlockingDetector
+
+        """
+
+    @property
+    def executor(self):
+        """Runs the ``in_thread`` hook functions.
+
+        Unless an executor was passed to the constructor, a
+        :class:`~concurrent.futures.ThreadPoolExecutor` with the default
+        (bounded) number of worker threads is created on first use.
+
+        :rtype: concurrent.futures.Executor
+
+        """
+        if self._executor is None:
+            self._executor = concurrent.futures.ThreadPoolExecutor(
+                thread_name_prefix='aiopluggy-%s' % self.project_name
+            )
+        return self._executor
+
+    @property
+    def process_executor(self):
+        """Runs the ``in_process`` hook functions.
+
+        Unless an executor was passed to the constructor, a
+        :class:`~concurrent.futures.ProcessPoolExecutor` with one worker
+        process per CPU is created on first use.
+
+        :rtype: concurrent.futures.Executor
+
+        """
+        if self._process_executor is None:
+            self._process_executor = concurrent.futures.ProcessPoolExecutor()
+        return self._process_executor
+
+    def enable_metrics(self, buckets=DEFAULT_BUCKETS):
+        """Start recording call counts, exception counts and latency
+        histograms, per hook and per hook function.
+
+        Args:
+            buckets: upper bounds, in seconds, of the histogram buckets.
+
+        Returns:
+            aiopluggy.metrics.Metrics: the (new) :attr:`metrics`.
+
+        """
+        self.metrics = Metrics(buckets)
+        for hook_caller in self._hook_callers():
+            self._instrument(hook_caller)
+        return self.metrics
+
+    def disable_metrics(self):
+        """Stop recording metrics. Hook calls are no longer instrumented."""
+        self.metrics = None
+        for hook_caller in self._hook_callers():
+            self._instrument(hook_caller)
+
+    def add_hookcall_monitoring(self, before, after):
+        """Report each hook call to a pair of monitor functions.
+
+        ``before(hook_name, hookimpls, kwargs)`` is called before, and
+        ``after(outcome, hook_name, hookimpls, kwargs)`` after each hook call,
+        also for asynchronous hooks. ``hookimpls`` lists the hook functions in
+        call order, and ``outcome`` is a :class:`~aiopluggy.Result` of the
+        hook call.
+
+        Returns:
+            a function that removes the monitors again. Without any monitors,
+            hook calls run without any instrumentation.
+
+        """
+        monitor = (before, after)
+        self._hookcall_monitors = self._hookcall_monitors + [monitor]
+        for hook_caller in self._hook_callers():
+            self._instrument(hook_caller)
+
+        def undo():
+            monitors = list(self._hookcall_monitors)
+            monitors.remove(monitor)
+            self._hookcall_monitors = monitors
+            for hook_caller in self._hook_callers():
+                self._instrument(hook_caller)
+        return undo
+
+    def enable_tracing(self, writer=None):
+        """Write a line before and after each hook call.
+
+        Args:
+            writer: function that takes a line of text. Defaults to
+                ``sys.stderr.write``.
+
+        Returns:
+            a function that disables tracing again.
+
+        """
+        if writer is None:
+            writer = sys.stderr.write
+        tracer = Tracer(writer)
+        return self.add_hookcall_monitoring(tracer.before, tracer.after)
+
+    def enable_blocking_detector(self, threshold=.01, callback=None):
+        """Time the synchronous hook functions that asynchronous hook calls
+        run on the event loop, and add up their blocking time per hook call.
+
+        Args:
+            threshold: report hook functions that run for at least this many
+                seconds.
+            callback: called as ``callback(plugin_name, hook_name, seconds)``
+                for each such hook function call.
+
+        Returns:
+            aiopluggy.blocking.BlockingDetector: the (new)
+            :attr:`blocking_detector`, with an aggregated
+            :meth:`~aiopluggy.blocking.BlockingDetector.report`.
+
+        """
+        self.blocking_detector = BlockingDetector(threshold, callback)
+        for hook_caller in self._hook_callers():
+            self._instrument(hook_caller)
+        return self.blocking_detector
+
+    def disable_blocking_detector(self):
+        """Stop timing synchronous hook functions."""
+        self.blocking_detector = None
+        for hook_caller in self._hook_callers():
+            self._instrument(hook_caller)
+
+    def _hook_callers(self):
+        return [
+            hook_caller for name, hook_caller in self.hooks.__dict__.items()
+            if name[0] != '_'
+        ]
+
+    def _hook_caller(self, name):
+        """The hook caller called ``name``, created if necessary."""
+        hook_caller = getattr(self.hooks, name, None)
+        if hook_caller is None:
+            hook_caller = HookCaller(name, self)
+            setattr(self.hooks, name, hook_caller)
+            if self.metrics is not None or self._hookcall_monitors or \
+                    self.blocking_detector is not None:
+                self._instrument(hook_caller)
+        return hook_caller
+
+    def _instrument(self, hook_caller):
+        """Add or remove metrics, monitors and blocking detection, on the hook
+        caller and in its plan."""
+        hook_caller.__dict__.pop('call', None)
+        if self._hookcall_monitors:
+            hook_caller.call = monitored_call(
+                self._hookcall_monitors, hook_caller, hook_caller.call
+            )
+        if self.blocking_detector is not None:
+            hook_caller.call = self.blocking_detector.watch_call(
+                hook_caller.name, hook_caller.call
+            )
+        if self.metrics is not None:
+            hook_caller.call = metered_call(
+                self.metrics.hook(hook_caller.name), hook_caller.call
+            )
+        hook_caller.invalidate()
 
     def register_specs(self, namespace):
         """ add new hook specifications defined in the given module_or_class.
@@ -44,12 +286,11 @@ class PluginManager(object):
             spec_flag_set = self._get_hookspec_flag_set(namespace, name)
             if spec_flag_set is None:
                 continue
-            hc = getattr(self.hooks, name, None)
-            if hc is None:
-                hc = HookCaller(name, self)
-                setattr(self.hooks, name, hc)
+            hc = self._hook_caller(name)
             # plugins registered this hook without knowing the spec
             hc.set_spec(namespace, spec_flag_set)
+            if hc.spec.is_replay:
+                self.history[name] = ReplayHistory(**hc.spec.options['replay'])
             names.append(name)
 
         if len(names) == 0:
@@ -59,9 +300,14 @@ class PluginManager(object):
             )
         return names
 
-    def register(self, namespace):
+    def register(self, namespace, max_concurrency=None):
         """ Register a plugin and return its canonical name.
 
+        Args:
+            max_concurrency (int): maximum number of this plugin's asynchronous
+                hook functions that may run concurrently, across all hooks and
+                calls. Defaults to ``plugin_concurrency``.
+
         Raises:
              ValueError: if the plugin is already registered.
 
@@ -74,26 +320,135 @@ class PluginManager(object):
         # XXX if an error happens we should make sure no state has been
         # changed at point of return
         self.registered_plugins.add(plugin_name)
+        hookimpls = self.hookimpls[plugin_name] = []
+        if max_concurrency is None:
+            max_concurrency = self.plugin_concurrency
+        semaphore = None
+        if max_concurrency is not None:
+            semaphore = LazySemaphore(max_concurrency)
+            self.plugin_semaphores[plugin_name] = semaphore
 
-        for name in dir(namespace):
-            hookimpl_flagset = self._get_hookimpl_flag_set(namespace, name)
-            if hookimpl_flagset is None:
-                continue
+        for name, hookimpl_flagset, args in self._discover_hookimpls(namespace):
             hookimpl = HookImpl(
-                namespace, name, hookimpl_flagset
+                namespace, name, hookimpl_flagset, args
             )
-            hook_caller = getattr(self.hooks, name, None)
-            if hook_caller is None:
-                hook_caller = HookCaller(name, self)
-                setattr(self.hooks, name, hook_caller)
+            hookimpl.semaphore = semaphore
+            hook_caller = self._hook_caller(name)
             # noinspection PyTypeChecker
             hook_caller.add_hookimpl(hookimpl)
-            if hook_caller.spec and hook_caller.spec.is_replay:
-                self.replay_to[hookimpl.name] = hookimpl
+            hookimpls.append(hookimpl)
+            if hook_caller.spec and hook_caller.spec.is_replay and \
+                    not hookimpl.is_wrapper:
+                self.replay_to.setdefault(hookimpl.name, []).append(hookimpl)
 
         self._replay_history()
         return plugin_name
 
+    def load_entrypoints(self, group, hook_names=None):
+        """Register the plugins advertised by the entry points of ``group``.
+
+        Args:
+            hook_names (dict[str, Iterable[str]]): names of the hooks that each
+                plugin implements, indexed by entry point name, as computed by
+                :meth:`hook_names` (typically at build time). Plugins with
+                known hook names are only imported when one of their hooks is
+                first called, or checked by :meth:`unimplemented` or
+                :meth:`missing`. Other plugins are imported right away.
+
+        Returns:
+            list[str]: the names of the entry points.
+
+        """
+        if hook_names is None:
+            hook_names = {}
+        names = []
+        for entry_point in _entry_points(group):
+            names.append(entry_point.name)
+            lazy_hook_names = hook_names.get(entry_point.name)
+            if lazy_hook_names is None:
+                self.register(entry_point.load())
+                continue
+            lazy_plugin = _LazyPlugin(entry_point, list(lazy_hook_names))
+            for name in lazy_plugin.hook_names:
+                hook_caller = self._hook_caller(name)
+                hook_caller.lazy_plugins.append(lazy_plugin)
+        return names
+
+    def hook_names(self, plugin):
+        """Sorted names of the hooks that ``plugin`` implements."""
+        return sorted(
+            name for name in dir(plugin)
+            if self._get_hookimpl_flag_set(plugin, name) is not None
+        )
+
+    def _load_lazy_plugins(self, hook_caller):
+        """Import and register the lazy plugins that implement
+        ``hook_caller``."""
+        while hook_caller.lazy_plugins:
+            lazy_plugin = hook_caller.lazy_plugins[0]
+            for name in lazy_plugin.hook_names:
+                getattr(self.hooks, name).lazy_plugins.remove(lazy_plugin)
+            self.register(lazy_plugin.entry_point.load())
+
+    def unregister(self, plugin):
+        """Unregister a plugin, given the plugin or its canonical name.
+
+        Hook calls that are in progress still call the plugin's hook
+        functions; later calls don't.
+
+        Raises:
+             ValueError: if the plugin isn't registered.
+
+        """
+        plugin_name = plugin if isinstance(plugin, str) else fqn(plugin)
+        if plugin_name not in self.registered_plugins:
+            raise ValueError("Plugin not registered: %s" % plugin_name)
+        self.registered_plugins.remove(plugin_name)
+        self.plugin_semaphores.pop(plugin_name, None)
+        for hookimpl in self.hookimpls.pop(plugin_name):
+            getattr(self.hooks, hookimpl.name).remove_hookimpl(hookimpl)
+
+    def _discover_hookimpls(self, namespace):
+        """Yield a ``(name, flag_set, args)`` tuple per hook function of
+        ``namespace``.
+
+        ``args`` is the result of :meth:`HookImpl.parse_args()
+        <aiopluggy.hooks.HookImpl.parse_args>`, or ``None`` if it still has to
+        be parsed. The hook functions of instances are looked up in their
+        class once, and cached. Only attributes set on the instance itself are
+        looked up per instance.
+
+        """
+        if inspect.ismodule(namespace) or inspect.isclass(namespace):
+            for name in dir(namespace):
+                flag_set = self._get_hookimpl_flag_set(namespace, name)
+                if flag_set is not None:
+                    yield name, flag_set, None
+            return
+        klass = type(namespace)
+        per_marker = _discovered.get(klass)
+        if per_marker is None:
+            per_marker = _discovered[klass] = {}
+        hookimpls = per_marker.get(self.implmarker)
+        if hookimpls is None:
+            hookimpls = []
+            for name in dir(klass):
+                flag_set = self._get_hookimpl_flag_set(klass, name)
+                if flag_set is not None:
+                    args = HookImpl.parse_args(
+                        namespace, name, getattr(namespace, name)
+                    )
+                    hookimpls.append((name, flag_set, args))
+            per_marker[self.implmarker] = hookimpls
+        own = getattr(namespace, '__dict__', {})
+        for name, flag_set, args in hookimpls:
+            if name not in own:
+                yield name, flag_set, args
+        for name in sorted(own):
+            flag_set = self._get_hookimpl_flag_set(namespace, name)
+            if flag_set is not None:
+                yield name, flag_set, None
+
     def _get_hookspec_flag_set(self, namespace, name):
         thing = getattr(namespace, name)
         if not inspect.isroutine(thing):
@@ -139,6 +494,8 @@ class PluginManager(object):
             if name[0] == "_":
                 continue
             hook = getattr(self.hooks, name)
+            if hook.spec is not None and len(hook.functions) == 0:
+                self._load_lazy_plugins(hook)
             if hook.spec is not None and len(hook.functions) == 0:
                 result[name] = hook
         return result
@@ -150,38 +507,47 @@ class PluginManager(object):
             if name[0] == "_":
                 continue
             hook = getattr(self.hooks, name)
+            if hook.spec is not None and hook.spec.is_required and len(hook.functions) == 0:
+                self._load_lazy_plugins(hook)
             if hook.spec is not None and hook.spec.is_required and len(hook.functions) == 0:
                 result[name] = hook
         return result
 
     def _replay_history(self):
-        if len(self.replay_to) == 0:
-            return
-        for name, kwargs in self.history:
-            if name not in self.replay_to:
-                continue
-            hookimpl = self.replay_to[name]
+        """Replay the history of replay hooks to their new implementations.
+
+        Only the histories of the hooks in ``replay_to`` are visited. Their
+        calls are replayed in historic order, also across hooks.
+
+        """
+        replay_to, self.replay_to = self.replay_to, {}
+
+        def records(name):
+            for seq, kwargs in self.history[name].records():
+                yield seq, name, kwargs
+
+        names = [name for name in replay_to if self.history.get(name)]
+        for seq, name, kwargs in heapq.merge(*map(records, names)):
             hookcaller = getattr(self.hooks, name)
             """:type: aiopluggy.hook_caller.HookCaller"""
-            if hookimpl.is_async or any(
-                b.is_async for b in hookcaller.before
-            ):
-                self.unscheduled_coros.append((
-                    hookimpl,
-                    hookcaller._multicall_first_async(
-                        kwargs, first_only=True, functions=[hookimpl]
-                    )
-                ))
-            else:
-                try:
-                    hookcaller.replay(hookimpl, kwargs)
-                except Exception as e:
-                    self.unhandled_exceptions.append((hookimpl, e))
-        self.replay_to = {}
+            for hookimpl in replay_to[name]:
+                self._replay(hookcaller, hookimpl, kwargs)
 
-    async def await_unscheduled_coros(self):
-        for hookimpl, coro in self.unscheduled_coros:
+    def _replay(self, hookcaller, hookimpl, kwargs):
+        if hookimpl.is_async or hookcaller.plan.has_async_before:
+            self.replays.schedule(
+                hookimpl,
+                hookcaller._multicall_first_async(
+                    kwargs, first_only=True, functions=[hookimpl]
+                )
+            )
+        else:
             try:
-                await coro
+                hookcaller.replay(hookimpl, kwargs)
             except Exception as e:
                 self.unhandled_exceptions.append((hookimpl, e))
+
+    async def await_unscheduled_coros(self):
+        """Run all pending asynchronous replays."""
+        if self.replays.busy:
+            await self.replays.drain()
@@ -0,0 +1,239 @@
+""" Bookkeeping of :ref:`replay <tutorial:replay>` hook calls.
+"""
+import asyncio
+import collections
+import itertools
+import time
+import weakref
+
+try:
+    import contextvars
+except ImportError:  # Python < 3.7
+    contextvars = None
+
+
+_sequence = itertools.count()
+"""Global call counter, to restore the historic order of calls across
+hooks."""
+
+_replaying = None if contextvars is None \
+    else contextvars.ContextVar('aiopluggy_replaying', default=False)
+"""Set in the context of running replays, and inherited by any tasks they
+spawn."""
+
+
+class _Strong(object):
+    """Stand-in for a :class:`weakref.ref` to a value that can't be weakly
+    referenced."""
+    __slots__ = ('_value',)
+
+    def __init__(self, value):
+        self._value = value
+
+    def __call__(self):
+        return self._value
+
+
+def _weaken(value):
+    try:
+        return weakref.ref(value)
+    except TypeError:
+        return _Strong(value)
+
+
+class ReplayHistory(object):
+    """Past calls of a single replay hook, subject to a retention policy.
+
+    Args:
+        maxlen: remember at most this many calls; the oldest calls are
+            forgotten first.
+        key: name of a hook argument, or a callable that takes the keyword
+            arguments dictionary of a call. Only the latest call per key is
+            remembered.
+        ttl: forget calls after this many seconds.
+        weak: hold argument values by weak reference, where possible. A call is
+            forgotten once any of its weakly held values is garbage collected.
+            If ``key`` is an argument name, the key value is weakly held as
+            well. Key values computed by a callable ``key`` are always held
+            strongly.
+        clock: source of the timestamps used for ``ttl``.
+
+    """
+    def __init__(self, maxlen=None, key=None, ttl=None, weak=False,
+                 clock=time.monotonic):
+        if maxlen is not None and maxlen < 1:
+            raise ValueError("maxlen must be at least 1")
+        if ttl is not None and ttl <= 0:
+            raise ValueError("ttl must be positive")
+        self.maxlen = maxlen
+        self.key = key
+        self.ttl = ttl
+        self.weak = weak
+        self._clock = clock
+        self._records = collections.OrderedDict()
+        """``(sequence_number, timestamp, kwargs)`` tuples, indexed by key
+        (or by sequence number if there's no ``key``), oldest first."""
+
+    def append(self, kwargs):
+        """Remember a call."""
+        seq = next(_sequence)
+        key = self.key
+        if key is None:
+            key = seq
+        elif callable(key):
+            key = key(kwargs)
+        else:
+            key = kwargs.get(key)
+            if self.weak:
+                try:
+                    key = weakref.ref(key)
+                except TypeError:
+                    pass
+        if self.weak:
+            kwargs = {name: _weaken(value) for name, value in kwargs.items()}
+        records = self._records
+        records.pop(key, None)
+        records[key] = (
+            seq, None if self.ttl is None else self._clock(), kwargs
+        )
+        if self.maxlen is not None and len(records) > self.maxlen:
+            records.popitem(last=False)
+        self._expire()
+
+    def _expire(self):
+        if self.ttl is None:
+            return
+        records = self._records
+        deadline = self._clock() - self.ttl
+        while records:
+            key, (seq, timestamp, kwargs) = next(iter(records.items()))
+            if timestamp >= deadline:
+                break
+            del records[key]
+
+    def records(self):
+        """Yield a ``(sequence_number, kwargs)`` tuple per remembered call,
+        oldest first.
+
+        Sequence numbers are global, so the records of several histories can be
+        merged in historic order.
+
+        """
+        self._expire()
+        if not self.weak:
+            for seq, timestamp, kwargs in list(self._records.values()):
+                yield seq, kwargs
+            return
+        for key, (seq, timestamp, refs) in list(self._records.items()):
+            kwargs = {name: ref() for name, ref in refs.items()}
+            if any(kwargs[name] is None and isinstance(ref, weakref.ref)
+                   for name, ref in refs.items()):
+                self._records.pop(key, None)
+                continue
+            yield seq, kwargs
+
+    def __iter__(self):
+        """Yield the keyword arguments of each remembered call, oldest
+        first."""
+        for seq, kwargs in self.records():
+            yield kwargs
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def __bool__(self):
+        # Cheaper than __len__(), but may count expired or collected calls.
+        return len(self._records) > 0
+
+    def clear(self):
+        self._records.clear()
+
+
+class ReplayScheduler(object):
+    """Runs the asynchronous replays deferred by
+    :meth:`~aiopluggy.PluginManager.register`.
+
+    Args:
+        unhandled_exceptions: list to append ``(hookimpl, exception)`` tuples
+            to, for replays that raised an exception.
+        max_concurrency: maximum number of replays to run concurrently, or
+            ``None`` for no limit.
+
+    """
+    def __init__(self, unhandled_exceptions, max_concurrency=None):
+        if max_concurrency is not None and max_concurrency < 1:
+            raise ValueError("max_concurrency must be at least 1")
+        self.unhandled_exceptions = unhandled_exceptions
+        self.max_concurrency = max_concurrency
+        self.busy = False
+        """``True`` while replays are pending or running. Cheap enough to be
+        checked on every hook call."""
+        self._pending = []
+        """:type: list[tuple[aiopluggy.hooks.HookImpl, Coroutine]]"""
+        self._task = None
+        self._tasks = set()
+        """Tasks running a replay."""
+
+    def __len__(self):
+        """Number of pending replays."""
+        return len(self._pending)
+
+    def schedule(self, hookimpl, coro):
+        self._pending.append((hookimpl, coro))
+        self.busy = True
+
+    async def drain(self):
+        """Run all pending replays, including replays scheduled meanwhile.
+
+        Concurrent callers share a single run, so each replay runs only once.
+        Hook calls made by the replays themselves don't wait, because they
+        would wait for themselves.
+
+        """
+        if self._in_replay():
+            return
+        while self._pending or self._task is not None:
+            if self._task is None:
+                self._task = asyncio.ensure_future(self._run())
+            await asyncio.shield(self._task)
+
+    def _in_replay(self):
+        if _replaying is not None:
+            return _replaying.get()
+        return asyncio.Task.current_task() in self._tasks
+
+    async def _run(self):
+        if _replaying is not None:
+            # Only affects the context of this task, and its child tasks:
+            _replaying.set(True)
+        try:
+            while self._pending:
+                batch, self._pending = self._pending, []
+                await self._run_batch(batch)
+        finally:
+            self._task = None
+            self.busy = len(self._pending) > 0
+
+    async def _run_batch(self, batch):
+        semaphore = None if self.max_concurrency is None \
+            else asyncio.Semaphore(self.max_concurrency)
+
+        async def run(hookimpl, coro):
+            try:
+                if semaphore is None:
+                    await coro
+                else:
+                    async with semaphore:
+                        await coro
+            except Exception as e:
+                self.unhandled_exceptions.append((hookimpl, e))
+
+        tasks = [
+            asyncio.ensure_future(run(hookimpl, coro))
+            for hookimpl, coro in batch
+        ]
+        self._tasks.update(tasks)
+        try:
+            await asyncio.gather(*tasks)
+        finally:
+            self._tasks.difference_update(tasks)
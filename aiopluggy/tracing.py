@@ -0,0 +1,61 @@
+""" Hook call monitoring; see
+:meth:`aiopluggy.PluginManager.add_hookcall_monitoring`.
+"""
+import asyncio
+import functools
+import sys
+
+from .helpers import Result
+
+
+def monitored_call(monitors, hook_caller, call):
+    """Wrap :meth:`HookCaller.call <aiopluggy.hook_caller.HookCaller.call>`
+    to report each hook call to ``monitors``, a list of ``(before, after)``
+    tuples."""
+    name = hook_caller.name
+
+    def after_call(outcome, hookimpls, kwargs):
+        for before, after in monitors:
+            after(outcome, name, hookimpls, kwargs)
+        return outcome.value
+
+    async def finish(coro, hookimpls, kwargs):
+        # noinspection PyBroadException
+        try:
+            outcome = Result(await coro)
+        except Exception:
+            outcome = Result(exc_info=sys.exc_info())
+        return after_call(outcome, hookimpls, kwargs)
+
+    @functools.wraps(call)
+    def monitored_hook_call(kwargs, **options):
+        hookimpls = hook_caller.plan.hookimpls
+        for before, after in monitors:
+            before(name, hookimpls, kwargs)
+        # noinspection PyBroadException
+        try:
+            result = call(kwargs, **options)
+        except Exception:
+            return after_call(
+                Result(exc_info=sys.exc_info()), hookimpls, kwargs
+            )
+        if asyncio.iscoroutine(result):
+            return finish(result, hookimpls, kwargs)
+        return after_call(Result(result), hookimpls, kwargs)
+    return monitored_hook_call
+
+
+class Tracer(object):
+    """Hook call monitor that writes a line before and after each hook call;
+    see :meth:`aiopluggy.PluginManager.enable_tracing`."""
+    def __init__(self, writer):
+        self.writer = writer
+
+    def before(self, hook_name, hookimpls, kwargs):
+        self.writer("%s %r [hook]\n" % (hook_name, kwargs))
+
+    def after(self, outcome, hook_name, hookimpls, kwargs):
+        result = outcome.exception
+        if result is None:
+            result = outcome.value
+        self.writer("finish %s --> %r [hook]\n" % (hook_name, result))
@@ -0,0 +1,238 @@
+""" Benchmarks for hook dispatch, registration and replay.
+
+Usage::
+
+    python benchmarks/bench_aiopluggy.py [--output FILE] [--quick] [--filter TEXT]
+
+Each benchmark reports the best and the median time per operation over several
+rounds. Results are printed, and written as JSON to ``--output``, so that runs
+can be compared over time.
+
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from aiopluggy import HookimplMarker, HookspecMarker, PluginManager, VERSION  # noqa: E402
+
+
+hookspec = HookspecMarker("bench")
+hookimpl = HookimplMarker("bench")
+
+IMPL_COUNTS = (1, 10, 100, 1000)
+
+
+class Specs(object):
+    @hookspec.sync
+    def sync_parallel(self, arg):
+        pass
+
+    @hookspec.sync.first_notnone
+    def sync_first(self, arg):
+        pass
+
+    @hookspec
+    def async_parallel(self, arg):
+        pass
+
+    @hookspec.first_notnone
+    def async_first(self, arg):
+        pass
+
+    @hookspec.sync.replay
+    def sync_replay(self, arg):
+        pass
+
+
+class SyncPlugin(object):
+    @hookimpl
+    def sync_parallel(self, arg):
+        return arg
+
+    @hookimpl
+    def sync_first(self, arg):
+        return None
+
+    @hookimpl
+    def sync_replay(self, arg):
+        pass
+
+
+class AsyncPlugin(object):
+    @hookimpl
+    async def async_parallel(self, arg):
+        return arg
+
+    @hookimpl
+    async def async_first(self, arg):
+        return None
+
+
+class BeforePlugin(object):
+    @hookimpl.before
+    async def async_parallel(self, arg):
+        pass
+
+
+def _manager(*plugins):
+    pm = PluginManager("bench")
+    pm.register_specs(Specs)
+    for plugin in plugins:
+        pm.register(plugin)
+    return pm
+
+
+def _measure(run, number, rounds):
+    """Seconds per operation of each round.
+
+    ``run(number)`` must perform ``number`` operations.
+
+    """
+    timings = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        run(number)
+        timings.append((time.perf_counter() - start) / number)
+    return timings
+
+
+def _calls(hook, loop=None):
+    if loop is None:
+        def run(number):
+            for i in range(number):
+                hook(arg=i)
+        return run
+
+    async def calls(number):
+        for i in range(number):
+            await hook(arg=i)
+
+    def run(number):
+        loop.run_until_complete(calls(number))
+    return run
+
+
+def bench_call(loop, scale):
+    """Hook calls, per mode and number of hook functions."""
+    for mode in ('sync_parallel', 'sync_first', 'async_parallel', 'async_first'):
+        is_async = mode.startswith('async')
+        for count in IMPL_COUNTS:
+            plugins = [
+                AsyncPlugin() if is_async else SyncPlugin()
+                for _ in range(count)
+            ]
+            pm = _manager(*plugins)
+            hook = getattr(pm.hooks, mode)
+            yield (
+                'call', {'mode': mode, 'impls': count},
+                _calls(hook, loop if is_async else None),
+                max(1, scale // count)
+            )
+
+
+def bench_before(loop, scale):
+    """Overhead of before-hooks on a parallel async hook with 10 functions."""
+    for count in (0, 1, 10):
+        plugins = [AsyncPlugin() for _ in range(10)]
+        plugins += [BeforePlugin() for _ in range(count)]
+        pm = _manager(*plugins)
+        yield (
+            'before', {'befores': count, 'impls': 10},
+            _calls(pm.hooks.async_parallel, loop), max(1, scale // 20)
+        )
+
+
+def bench_register(loop, scale):
+    """Registration of plugin instances, of one class or of distinct
+    classes."""
+    def same_class(number):
+        pm = _manager()
+        for _ in range(number):
+            pm.register(SyncPlugin())
+
+    def distinct_classes(number):
+        pm = _manager()
+        for _ in range(number):
+            pm.register(type('Plugin', (SyncPlugin,), {})())
+
+    yield 'register', {'classes': 'same'}, same_class, max(1, scale // 10)
+    yield 'register', {'classes': 'distinct'}, distinct_classes, \
+        max(1, scale // 10)
+
+
+def bench_replay(loop, scale):
+    """Registration of a plugin that gets a large history replayed."""
+    for size in (100, 10000):
+        pm = _manager()
+        for i in range(size):
+            pm.hooks.sync_replay(arg=i)
+
+        def run(number, pm=pm):
+            for _ in range(number):
+                name = pm.register(SyncPlugin())
+                pm.unregister(name)
+        yield 'replay', {'history': size}, run, max(1, scale // size)
+
+
+BENCHMARKS = (bench_call, bench_before, bench_register, bench_replay)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--output', help="write JSON results to this file")
+    parser.add_argument('--quick', action='store_true',
+                        help="fewer operations and rounds, for smoke tests")
+    parser.add_argument('--filter', default='',
+                        help="only run benchmarks whose name contains this")
+    args = parser.parse_args(argv)
+    scale, rounds = (200, 3) if args.quick else (20000, 7)
+
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    results = []
+    try:
+        for benchmark in BENCHMARKS:
+            for name, params, run, number in benchmark(loop, scale):
+                if args.filter not in name:
+                    continue
+                timings = _measure(run, number, rounds)
+                result = {
+                    'name': name,
+                    'params': params,
+                    'operations': number,
+                    'rounds': rounds,
+                    'best': min(timings),
+                    'median': statistics.median(timings),
+                }
+                results.append(result)
+                print('%-10s %-40s %12.2f us/op' % (
+                    name,
+                    ' '.join('%s=%s' % item for item in sorted(params.items())),
+                    result['best'] * 1e6
+                ))
+    finally:
+        loop.close()
+
+    if args.output:
+        report = {
+            'aiopluggy': VERSION,
+            'python': platform.python_version(),
+            'implementation': platform.python_implementation(),
+            'platform': platform.platform(),
+            'timestamp': time.time(),
+            'unit': 'seconds per operation',
+            'results': results,
+        }
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+
+
+if __name__ == '__main__':
+    main()
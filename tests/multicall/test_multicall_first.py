@@ -127,3 +127,102 @@ def test_sync(pm: PluginManager):
     values = [result.value for result in results]
     assert values == [4, 2, 6, 1, 3, 5]
     assert out == [4, 2, 6, 1, 3, 5]
+
+
+@pytest.mark.asyncio
+async def test_deadline(pm: PluginManager):
+    class HookSpec(object):
+        @hookspec.first_notnone
+        def some_method(self):
+            pass
+
+    class Plugin(object):
+        @hookimpl
+        async def some_method(self):
+            await asyncio.sleep(10)
+
+    pm.register_specs(HookSpec())
+    pm.register(Plugin())
+    deadline = asyncio.get_event_loop().time() + .01
+    with pytest.raises(asyncio.TimeoutError):
+        await pm.hooks.some_method.call({}, deadline=deadline)
+
+
+@pytest.mark.asyncio
+async def test_race(pm: PluginManager):
+    cancelled = []
+
+    class HookSpec(object):
+        @hookspec.first_notnone.race
+        def some_method(self, arg):
+            pass
+
+    class Miss(object):
+        @hookimpl
+        async def some_method(self, arg):
+            await asyncio.sleep(.01)
+
+    class Slow(object):
+        @hookimpl
+        async def some_method(self, arg):
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                cancelled.append('slow')
+                raise
+            return 'slow'
+
+    class Fast(object):
+        @hookimpl
+        async def some_method(self, arg):
+            await asyncio.sleep(.02)
+            return 'fast'
+
+    class Last(object):
+        @hookimpl.try_last
+        async def some_method(self, arg):
+            return 'last'
+
+    pm.register_specs(HookSpec())
+    pm.register(Last())
+    pm.register(Fast())
+    pm.register(Slow())
+    pm.register(Miss())
+    assert await asyncio.wait_for(pm.hooks.some_method(arg=0), 1) == 'fast'
+    await asyncio.sleep(0)
+    assert cancelled == ['slow']
+
+
+def test_race_requires_first_notnone(pm: PluginManager):
+    class HookSpec(object):
+        @hookspec.race
+        def some_method(self, arg):
+            pass
+
+    with pytest.raises(ValueError):
+        pm.register_specs(HookSpec())
+
+
+@pytest.mark.asyncio
+async def test_first_notnone_in_thread():
+    import concurrent.futures
+    import threading
+    executor = concurrent.futures.ThreadPoolExecutor(1)
+    pm = PluginManager("example", executor=executor)
+
+    class HookSpec(object):
+        @hookspec.first_notnone
+        def some_method(self, arg):
+            pass
+
+    class Plugin(object):
+        @hookimpl.in_thread
+        def some_method(self, arg):
+            return threading.current_thread()
+
+    pm.register_specs(HookSpec())
+    pm.register(Plugin())
+    assert pm.executor is executor
+    result = await pm.hooks.some_method(arg=0)
+    assert result is not threading.current_thread()
+    executor.shutdown()
@@ -111,3 +111,644 @@ def test_sync(pm: PluginManager):
     values = [result.value for result in results]
     assert values == [4, 2, 6, 1, 3, 5]
     assert out == [4, 2, 6, 1, 3, 5]
+
+
+def _concurrency_probe():
+    state = {'running': 0, 'peak': 0}
+
+    async def probe(arg):
+        state['running'] += 1
+        state['peak'] = max(state['peak'], state['running'])
+        await asyncio.sleep(.01)
+        state['running'] -= 1
+        return arg
+    return state, probe
+
+
+@pytest.mark.asyncio
+async def test_max_concurrency(pm: PluginManager):
+    state, probe = _concurrency_probe()
+
+    class HookSpec(object):
+        @hookspec.bounded(max_concurrency=2)
+        def some_method(self, arg):
+            pass
+
+    class Plugin(object):
+        @hookimpl
+        async def some_method(self, arg):
+            return await probe(arg)
+
+    pm.register_specs(HookSpec())
+    for _ in range(5):
+        pm.register(Plugin())
+    results = await pm.hooks.some_method(arg=1)
+    assert [result.value for result in results] == [1] * 5
+    assert state['peak'] == 2
+
+    state['peak'] = 0
+    results = await pm.hooks.some_method.call({'arg': 1}, max_concurrency=3)
+    assert len(results) == 5
+    assert state['peak'] == 3
+
+
+@pytest.mark.asyncio
+async def test_plugin_concurrency():
+    state, probe = _concurrency_probe()
+    pm = PluginManager('example', plugin_concurrency=1)
+
+    class HookSpec(object):
+        @hookspec
+        def some_method(self, arg):
+            pass
+
+        @hookspec
+        def other_method(self, arg):
+            pass
+
+    class Plugin(object):
+        @hookimpl
+        async def some_method(self, arg):
+            return await probe(arg)
+
+        @hookimpl
+        async def other_method(self, arg):
+            return await probe(arg)
+
+    pm.register_specs(HookSpec)
+    pm.register(Plugin())
+    pm.register(Plugin(), max_concurrency=2)
+    await asyncio.gather(
+        pm.hooks.some_method(arg=1),
+        pm.hooks.other_method(arg=1),
+    )
+    assert state['peak'] == 3
+
+
+def test_plugin_concurrency_new_loop():
+    # Limits of plugins registered outside of the event loop work in any loop:
+    state, probe = _concurrency_probe()
+    pm = PluginManager('example', plugin_concurrency=1)
+
+    class HookSpec(object):
+        @hookspec
+        def some_method(self, arg):
+            pass
+
+    class Plugin(object):
+        @hookimpl
+        async def some_method(self, arg):
+            return await probe(arg)
+
+    pm.register_specs(HookSpec)
+    pm.register(Plugin())
+
+    async def calls():
+        await asyncio.gather(
+            pm.hooks.some_method(arg=1), pm.hooks.some_method(arg=2)
+        )
+    for _ in range(2):
+        loop = asyncio.new_event_loop()
+        try:
+            loop.run_until_complete(calls())
+        finally:
+            loop.close()
+    assert state['peak'] == 1
+
+
+@pytest.mark.asyncio
+async def test_deadline(pm: PluginManager):
+    cancelled = []
+
+    class HookSpec(object):
+        @hookspec
+        def some_method(self, arg):
+            pass
+
+    class FastPlugin(object):
+        @hookimpl
+        async def some_method(self, arg):
+            return arg
+
+    class SlowPlugin(object):
+        @hookimpl
+        async def some_method(self, arg):
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                cancelled.append(arg)
+                raise
+
+    class LaterPlugin(object):
+        @hookimpl.try_last
+        def some_method(self, arg):
+            return arg
+
+    pm.register_specs(HookSpec())
+    pm.register(FastPlugin())
+    pm.register(SlowPlugin())
+    pm.register(LaterPlugin())
+    deadline = asyncio.get_event_loop().time() + .05
+    results = await pm.hooks.some_method.call({'arg': 1}, deadline=deadline)
+    assert len(results) == 3
+    assert results[0].value == 1
+    for result in results[1:]:
+        with pytest.raises(asyncio.TimeoutError):
+            result.value
+    await asyncio.sleep(0)
+    assert cancelled == [1]
+
+
+@pytest.mark.asyncio
+async def test_hookimpl_timeout(pm: PluginManager):
+    class HookSpec(object):
+        @hookspec
+        def some_method(self):
+            pass
+
+    class SlowPlugin(object):
+        @hookimpl.timeout(seconds=.01)
+        async def some_method(self):
+            await asyncio.sleep(10)
+
+    class FastPlugin(object):
+        @hookimpl.timeout(seconds=1)
+        async def some_method(self):
+            return 'fast'
+
+    pm.register_specs(HookSpec())
+    pm.register(SlowPlugin())
+    pm.register(FastPlugin())
+    results = await pm.hooks.some_method()
+    assert results[0].value == 'fast'
+    with pytest.raises(asyncio.TimeoutError):
+        results[1].value
+
+    class SyncPlugin(object):
+        @hookimpl.timeout(seconds=1)
+        def some_method(self):
+            pass
+    with pytest.raises(ValueError):
+        pm.register(SyncPlugin())
+
+
+@pytest.mark.asyncio
+async def test_stream(pm: PluginManager):
+    cancelled = []
+
+    class HookSpec(object):
+        @hookspec
+        def some_method(self, arg):
+            pass
+
+    class Plugin1(object):
+        @hookimpl.try_first
+        async def some_method(self, arg):
+            await asyncio.sleep(.02)
+            return 1
+
+    class Plugin2(object):
+        @hookimpl
+        async def some_method(self, arg):
+            return 2
+
+    class Plugin3(object):
+        @hookimpl
+        async def some_method(self, arg):
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                cancelled.append(3)
+                raise
+
+    pm.register_specs(HookSpec())
+    pm.register(Plugin1())
+    pm.register(Plugin2())
+    pm.register(Plugin3())
+    values = []
+    async with pm.hooks.some_method.stream(arg=0) as stream:
+        async for result in stream:
+            values.append(result.value)
+            if result.value == 2:
+                break
+    assert values == [1, 2]
+    assert cancelled == [3]
+
+    # Without a context manager, the stream is cancelled when it's collected:
+    async for result in pm.hooks.some_method.stream(arg=0):
+        if result.value == 2:
+            break
+    for _ in range(3):
+        await asyncio.sleep(0)
+    assert cancelled == [3, 3]
+
+    with pytest.raises(TypeError):
+        pm.hooks.some_method.stream(foo=0)
+
+
+@pytest.mark.asyncio
+async def test_in_thread(pm: PluginManager):
+    import threading
+    barrier = threading.Barrier(2, timeout=1)
+
+    class HookSpec(object):
+        @hookspec
+        def some_method(self, arg):
+            pass
+
+    class Plugin1(object):
+        @hookimpl.in_thread
+        def some_method(self, arg):
+            barrier.wait()
+            return threading.current_thread()
+
+    class Plugin2(object):
+        @hookimpl.in_thread
+        def some_method(self, arg):
+            barrier.wait()
+            return threading.current_thread()
+
+    pm.register_specs(HookSpec())
+    pm.register(Plugin1())
+    pm.register(Plugin2())
+    # Both functions block until the other one runs:
+    results = await pm.hooks.some_method(arg=0)
+    threads = {result.value for result in results}
+    assert len(threads) == 2
+    assert threading.current_thread() not in threads
+
+    class AsyncPlugin(object):
+        @hookimpl.in_thread
+        async def some_method(self, arg):
+            pass
+    with pytest.raises(ValueError):
+        pm.register(AsyncPlugin())
+
+
+def test_in_thread_sync(pm: PluginManager):
+    import threading
+
+    class HookSpec(object):
+        @hookspec.sync
+        def some_method(self, arg):
+            pass
+
+    class Plugin(object):
+        @hookimpl.in_thread
+        def some_method(self, arg):
+            return threading.current_thread()
+
+    pm.register_specs(HookSpec())
+    pm.register(Plugin())
+    results = pm.hooks.some_method(arg=0)
+    assert results[0].value is threading.current_thread()
+
+
+class _Pickled(object):
+    count = 0
+
+    def __reduce__(self):
+        _Pickled.count += 1
+        return _Pickled, ()
+
+
+class _CpuPlugin(object):
+    def __init__(self, factor):
+        self.factor = factor
+
+    @hookimpl.in_process
+    def some_method(self, arg, extra):
+        import os
+        return os.getpid(), arg * self.factor
+
+
+class _FailingCpuPlugin(object):
+    @hookimpl.in_process
+    def some_method(self, arg):
+        raise ValueError(arg)
+
+
+class _SumPlugin(object):
+    @hookimpl.in_process
+    def score(self, doc):
+        return sum(doc)
+
+
+@pytest.mark.asyncio
+async def test_in_process_pickles_per_call():
+    import concurrent.futures
+    with concurrent.futures.ProcessPoolExecutor(1) as executor:
+        pm = PluginManager("example", process_executor=executor)
+
+        class HookSpec(object):
+            @hookspec.values
+            def score(self, doc):
+                pass
+
+        class Before(object):
+            @hookimpl.before
+            def score(self, doc):
+                doc.append(100)
+
+        pm.register_specs(HookSpec())
+        pm.register(Before())
+        pm.register(_SumPlugin())
+        doc = [1]
+        # Both calls start in the same iteration of the event loop:
+        first = asyncio.ensure_future(pm.hooks.score(doc=doc))
+        second = asyncio.ensure_future(pm.hooks.score(doc=doc))
+        assert await first == [101]
+        assert await second == [201]
+
+
+@pytest.mark.asyncio
+async def test_in_process():
+    import concurrent.futures
+    import os
+    with concurrent.futures.ProcessPoolExecutor(2) as executor:
+        pm = PluginManager("example", process_executor=executor)
+
+        class HookSpec(object):
+            @hookspec
+            def some_method(self, arg, extra):
+                pass
+
+        pm.register_specs(HookSpec())
+        pm.register(_CpuPlugin(2))
+        pm.register(_CpuPlugin(3))
+        pm.register(_FailingCpuPlugin())
+        _Pickled.count = 0
+        results = await pm.hooks.some_method(arg=7, extra=_Pickled())
+        # Pickled once per call, not once per hook function:
+        assert _Pickled.count == 1
+        values = []
+        for result in results:
+            try:
+                values.append(result.value)
+            except ValueError:
+                pass
+        assert len(values) == 2
+        assert sorted(value for pid, value in values) == [14, 21]
+        assert os.getpid() not in {pid for pid, value in values}
+
+        # Synchronous calls run in this process:
+        pid, value = pm.hooks.some_method._multicall_sync(
+            {'arg': 1, 'extra': None}
+        )[1].value
+        assert pid == os.getpid()
+
+    class Unpicklable(object):
+        @hookimpl.in_process
+        def some_method(self, arg):
+            pass
+    with pytest.raises(ValueError):
+        pm.register(Unpicklable())
+
+
+@pytest.mark.asyncio
+async def test_values(pm: PluginManager):
+    cancelled = []
+
+    class HookSpec(object):
+        @hookspec.values
+        def some_method(self, arg):
+            pass
+
+        @hookspec.values(errors='return')
+        def other_method(self, arg):
+            pass
+
+        @hookspec.sync.values
+        def sync_method(self, arg):
+            pass
+
+    class Plugin1(object):
+        @hookimpl
+        async def some_method(self, arg):
+            try:
+                await asyncio.sleep(arg)
+            except asyncio.CancelledError:
+                cancelled.append(arg)
+                raise
+
+        @hookimpl
+        async def other_method(self, arg):
+            return arg + 1
+
+        @hookimpl
+        def sync_method(self, arg):
+            return arg + 1
+
+    class Plugin2(object):
+        @hookimpl
+        async def some_method(self, arg):
+            raise KeyError(arg)
+
+        @hookimpl
+        def other_method(self, arg):
+            raise KeyError(arg)
+
+        @hookimpl
+        def sync_method(self, arg):
+            return arg + 2
+
+    pm.register_specs(HookSpec())
+    pm.register(Plugin1())
+    pm.register(Plugin2())
+
+    with pytest.raises(KeyError):
+        await pm.hooks.some_method(arg=1)
+    await asyncio.sleep(0)
+    assert cancelled == [1]
+    results = await pm.hooks.some_method.call({'arg': 0}, values=False)
+    assert len(results) == 2
+    assert all(isinstance(result, Result) for result in results)
+    results = await pm.hooks.some_method.call(
+        {'arg': 1}, values='return',
+        deadline=asyncio.get_event_loop().time() + .01
+    )
+    assert {type(result) for result in results} == \
+        {KeyError, asyncio.TimeoutError}
+
+    results = await pm.hooks.other_method(arg=1)
+    assert 2 in results
+    errors = [result for result in results if isinstance(result, KeyError)]
+    assert len(errors) == 1 and errors[0].__traceback__ is None
+
+    assert sorted(pm.hooks.sync_method(arg=1)) == [2, 3]
+    results = pm.hooks.sync_method.call({'arg': 1}, values=False)
+    assert [result.value for result in results] == [3, 2]
+
+
+def test_values_spec():
+    with pytest.raises(ValueError):
+        PluginManager("example").register_specs(type('Spec', (), {
+            'some_method': hookspec.values.first_notnone(lambda self: None)
+        }))
+    with pytest.raises(ValueError):
+        PluginManager("example").register_specs(type('Spec', (), {
+            'some_method': hookspec.values(errors='ignore')(lambda self: None)
+        }))
+
+
+@pytest.mark.asyncio
+async def test_fail_fast(pm: PluginManager):
+    out = []
+    cancelled = []
+
+    class HookSpec(object):
+        @hookspec.fail_fast
+        def some_method(self, arg):
+            pass
+
+        @hookspec.sync.fail_fast
+        def sync_method(self, arg):
+            pass
+
+    class Plugin1(object):
+        @hookimpl.try_first
+        async def some_method(self, arg):
+            try:
+                await asyncio.sleep(arg)
+            except asyncio.CancelledError:
+                cancelled.append(arg)
+                raise
+            return arg
+
+        @hookimpl.try_first
+        def sync_method(self, arg):
+            if arg:
+                raise KeyError(arg)
+            return arg
+
+    class Plugin2(object):
+        @hookimpl.try_first
+        async def some_method(self, arg):
+            if arg:
+                raise KeyError(arg)
+            return arg
+
+    class Plugin3(object):
+        @hookimpl
+        async def some_method(self, arg):
+            out.append(arg)
+            return arg
+
+        @hookimpl
+        def sync_method(self, arg):
+            out.append(arg)
+            return arg
+
+    pm.register_specs(HookSpec())
+    pm.register(Plugin1())
+    pm.register(Plugin2())
+    pm.register(Plugin3())
+
+    with pytest.raises(HookFailureException) as excinfo:
+        await pm.hooks.some_method(arg=1)
+    assert [type(e) for e in excinfo.value.causes] == [KeyError]
+    await asyncio.sleep(0)
+    assert cancelled == [1]
+    assert out == []
+
+    results = await pm.hooks.some_method(arg=0)
+    assert [result.value for result in results] == [0, 0, 0]
+    assert out == [0]
+
+    results = await pm.hooks.some_method.call({'arg': .01}, fail_fast=False)
+    assert len(results) == 3
+    assert out == [0, .01]
+
+    with pytest.raises(HookFailureException):
+        pm.hooks.sync_method(arg=1)
+    assert out == [0, .01]
+    assert len(pm.hooks.sync_method.call({'arg': 1}, fail_fast=False)) == 2
+
+
+@pytest.mark.asyncio
+async def test_reduce(pm: PluginManager):
+    import collections
+
+    def merge(counts, result):
+        counts.update(result)
+        return counts
+
+    class HookSpec(object):
+        @hookspec.reduce(function=merge, initial=collections.Counter())
+        def some_method(self, arg):
+            pass
+
+        @hookspec.sync.reduce(function=lambda total, result: total + result,
+                              initial=0)
+        def sync_method(self, arg):
+            pass
+
+    class Plugin1(object):
+        @hookimpl
+        async def some_method(self, arg):
+            await asyncio.sleep(.01)
+            return {arg: 1, 'slow': 1}
+
+        @hookimpl
+        def sync_method(self, arg):
+            return arg
+
+    class Plugin2(object):
+        @hookimpl.try_last
+        def some_method(self, arg):
+            if arg is None:
+                raise KeyError(arg)
+            return {arg: 2}
+
+        @hookimpl
+        def sync_method(self, arg):
+            return arg * 2
+
+    pm.register_specs(HookSpec())
+    pm.register(Plugin1())
+    pm.register(Plugin2())
+    assert await pm.hooks.some_method(arg='a') == {'a': 3, 'slow': 1}
+    # The initial value is copied per call:
+    assert await pm.hooks.some_method(arg='b') == {'b': 3, 'slow': 1}
+    with pytest.raises(KeyError):
+        await pm.hooks.some_method(arg=None)
+    assert pm.hooks.sync_method(arg=2) == 6
+
+    with pytest.raises(ValueError):
+        PluginManager("example").register_specs(type('Spec', (), {
+            'some_method': hookspec.reduce(initial=0)(lambda self: None)
+        }))
+
+
+def test_reduce_errors(pm: PluginManager):
+    seen = []
+
+    def collect(collected, result):
+        seen.append(result)
+        if result == 'bad':
+            raise RuntimeError('reducer bug')
+        return collected + [result]
+
+    class HookSpec(object):
+        @hookspec.sync.reduce(function=collect, initial=[]).values(
+            errors='return')
+        def some_method(self, arg):
+            pass
+
+    class Plugin(object):
+        @hookimpl
+        def some_method(self, arg):
+            if arg is None:
+                raise KeyError(arg)
+            return arg
+
+    pm.register_specs(HookSpec())
+    pm.register(Plugin())
+    # Exceptions of hook functions are folded:
+    result, = pm.hooks.some_method(arg=None)
+    assert isinstance(result, KeyError)
+    # Exceptions of the reducer are raised:
+    seen.clear()
+    with pytest.raises(RuntimeError):
+        pm.hooks.some_method(arg='bad')
+    assert seen == ['bad']
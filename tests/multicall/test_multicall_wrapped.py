@@ -0,0 +1,272 @@
+import pytest
+
+from aiopluggy import *
+
+
+hookspec = HookspecMarker("example")
+hookimpl = HookimplMarker("example")
+
+
+def test_sync_wrappers(pm: PluginManager):
+    out = []
+
+    class HookSpec(object):
+        @hookspec.sync
+        def some_method(self, arg):
+            pass
+
+    class Plugin(object):
+        @hookimpl
+        def some_method(self, arg):
+            out.append('call')
+            return arg
+
+    class Outer(object):
+        @hookimpl.wrapper.try_first
+        def some_method(self, arg):
+            out.append('outer')
+            results = yield
+            out.append('/outer')
+            for result in results:
+                result.value += 1
+
+    class Inner(object):
+        @hookimpl.wrapper
+        def some_method(self):
+            out.append('inner')
+            yield
+            out.append('/inner')
+
+    pm.register_specs(HookSpec())
+    pm.register(Plugin())
+    pm.register(Outer())
+    pm.register(Inner())
+    assert [r.value for r in pm.hooks.some_method(arg=1)] == [2]
+    assert out == ['outer', 'inner', 'call', '/inner', '/outer']
+
+
+@pytest.mark.asyncio
+async def test_async_wrappers(pm: PluginManager):
+    out = []
+
+    class HookSpec(object):
+        @hookspec
+        def some_method(self, arg):
+            pass
+
+    class Plugin(object):
+        @hookimpl
+        async def some_method(self, arg):
+            return arg
+
+    class AsyncWrapper(object):
+        @hookimpl.wrapper
+        async def some_method(self, arg):
+            out.append('async')
+            results = yield
+            out.append('/async')
+            for result in results:
+                result.value *= 10
+
+    class SyncWrapper(object):
+        @hookimpl.wrapper
+        def some_method(self, arg):
+            out.append('sync')
+            yield
+            out.append('/sync')
+
+    pm.register_specs(HookSpec())
+    pm.register(Plugin())
+    pm.register(SyncWrapper())
+    pm.register(AsyncWrapper())
+    results = await pm.hooks.some_method(arg=2)
+    assert [r.value for r in results] == [20]
+    assert out == ['async', 'sync', '/sync', '/async']
+
+
+@pytest.mark.asyncio
+async def test_first_notnone_wrapper(pm: PluginManager):
+    class HookSpec(object):
+        @hookspec.first_notnone
+        def some_method(self, arg):
+            pass
+
+    class Plugin(object):
+        @hookimpl
+        async def some_method(self, arg):
+            if arg is None:
+                raise ValueError()
+            return arg
+
+    class Wrapper(object):
+        @hookimpl.wrapper
+        def some_method(self):
+            result = yield
+            if result.exception is not None:
+                result.value = 'recovered'
+
+    pm.register_specs(HookSpec())
+    pm.register(Plugin())
+    pm.register(Wrapper())
+    assert await pm.hooks.some_method(arg=1) == 1
+    assert await pm.hooks.some_method(arg=None) == 'recovered'
+
+
+def test_wrapper_aborts_call(pm: PluginManager):
+    out = []
+
+    class HookSpec(object):
+        @hookspec.sync
+        def some_method(self):
+            pass
+
+    class Plugin(object):
+        @hookimpl
+        def some_method(self):
+            out.append('call')
+
+    class Outer(object):
+        @hookimpl.wrapper.try_first
+        def some_method(self):
+            try:
+                yield
+            finally:
+                out.append('closed')
+
+    class Auth(object):
+        @hookimpl.wrapper
+        def some_method(self):
+            raise PermissionError()
+            # noinspection PyUnreachableCode
+            yield
+
+    pm.register_specs(HookSpec())
+    pm.register(Plugin())
+    pm.register(Outer())
+    pm.register(Auth())
+    with pytest.raises(PermissionError):
+        pm.hooks.some_method()
+    assert out == ['closed']
+
+
+def test_wrapper_sees_failed_call(pm: PluginManager):
+    seen = []
+
+    class HookSpec(object):
+        @hookspec.sync
+        def some_method(self, fail):
+            pass
+
+        @hookspec.sync.first_notnone
+        def first_method(self, fail):
+            pass
+
+    class Before(object):
+        @hookimpl.before
+        def some_method(self, fail):
+            if fail:
+                raise KeyError()
+
+        @hookimpl.before
+        def first_method(self, fail):
+            if fail:
+                raise KeyError()
+
+    class Plugin(object):
+        @hookimpl
+        def some_method(self, fail):
+            return 'called'
+
+        @hookimpl
+        def first_method(self, fail):
+            return 'called'
+
+    class Timer(object):
+        @hookimpl.wrapper
+        def some_method(self, fail):
+            outcome = yield
+            seen.append(outcome)
+
+        @hookimpl.wrapper
+        def first_method(self, fail):
+            outcome = yield
+            seen.append(outcome)
+            if outcome.exception is not None:
+                outcome.value = 'recovered'
+
+    pm.register_specs(HookSpec())
+    pm.register(Before())
+    pm.register(Plugin())
+    pm.register(Timer())
+    results = pm.hooks.some_method(fail=False)
+    assert [result.value for result in results] == ['called']
+    assert seen.pop() is results
+    with pytest.raises(KeyError):
+        pm.hooks.some_method(fail=True)
+    assert isinstance(seen.pop().exception, KeyError)
+    assert pm.hooks.first_method(fail=True) == 'recovered'
+    assert isinstance(seen.pop(), Result)
+
+
+@pytest.mark.asyncio
+async def test_wrapper_sees_fail_fast(pm: PluginManager):
+    seen = []
+
+    class HookSpec(object):
+        @hookspec.fail_fast
+        def some_method(self):
+            pass
+
+    class Plugin(object):
+        @hookimpl
+        async def some_method(self):
+            raise KeyError()
+
+    class Timer(object):
+        @hookimpl.wrapper
+        async def some_method(self):
+            outcome = yield
+            seen.append(outcome)
+
+    pm.register_specs(HookSpec())
+    pm.register(Plugin())
+    pm.register(Timer())
+    with pytest.raises(HookFailureException):
+        await pm.hooks.some_method()
+    assert isinstance(seen[0].exception, HookFailureException)
+
+
+def test_wrapper_errors(pm: PluginManager):
+    class NotAGenerator(object):
+        @hookimpl.wrapper
+        def some_method(self):
+            pass
+    with pytest.raises(ValueError):
+        pm.register(NotAGenerator())
+
+    class NoYield(object):
+        @hookimpl.wrapper
+        def other_method(self):
+            if False:
+                yield
+    pm.register(NoYield())
+    with pytest.raises(RuntimeError):
+        pm.hooks.other_method()
+
+    class FailingTeardown(object):
+        @hookimpl.wrapper
+        def third_method(self):
+            yield
+            raise KeyError()
+
+    class SecondYield(object):
+        @hookimpl.wrapper
+        def third_method(self):
+            yield
+            yield
+
+    pm.register(FailingTeardown())
+    pm.register(SecondYield())
+    with pytest.raises(HookWrapperException) as e:
+        pm.hooks.third_method()
+    assert [type(c) for c in e.value.causes] == [KeyError, RuntimeError]
@@ -0,0 +1,73 @@
+import time
+
+import pytest
+
+from aiopluggy import *
+
+
+hookspec = HookspecMarker("example")
+hookimpl = HookimplMarker("example")
+
+
+@pytest.mark.asyncio
+async def test_blocking_detector(pm: PluginManager):
+    events = []
+
+    class HookSpec(object):
+        @hookspec
+        def some_method(self):
+            pass
+
+    class Blocking(object):
+        @hookimpl
+        def some_method(self):
+            time.sleep(.02)
+
+    class Fast(object):
+        @hookimpl
+        def some_method(self):
+            pass
+
+    class Async(object):
+        @hookimpl
+        async def some_method(self):
+            pass
+
+    pm.register_specs(HookSpec())
+    blocking = pm.register(Blocking())
+    pm.register(Fast())
+    pm.register(Async())
+    detector = pm.enable_blocking_detector(
+        threshold=.01,
+        callback=lambda *args: events.append(args)
+    )
+    await pm.hooks.some_method()
+    await pm.hooks.some_method()
+
+    assert [event[:2] for event in events] == [(blocking, 'some_method')] * 2
+    assert all(event[2] >= .02 for event in events)
+    report = detector.report()
+    assert len(report['offenders']) == 1
+    offender = report['offenders'][0]
+    assert offender['plugin'] == blocking
+    assert offender['count'] == 2
+    assert offender['max'] >= .02
+    lag = report['call_lag']['some_method']
+    assert lag['count'] == 2
+    assert lag['seconds'] >= .04
+
+    pm.disable_blocking_detector()
+    await pm.hooks.some_method()
+    assert len(events) == 2
+
+
+def test_blocking_detector_ignores_sync_hooks(pm: PluginManager):
+    class Blocking(object):
+        @hookimpl
+        def some_method(self):
+            time.sleep(.02)
+
+    pm.register(Blocking())
+    detector = pm.enable_blocking_detector(threshold=.01)
+    pm.hooks.some_method()
+    assert detector.report() == {'offenders': [], 'call_lag': {}}
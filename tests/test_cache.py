@@ -0,0 +1,127 @@
+import pytest
+
+from aiopluggy import *
+from aiopluggy.cache import CacheInfo, ResultCache
+
+
+hookspec = HookspecMarker("example")
+hookimpl = HookimplMarker("example")
+
+
+def test_result_cache():
+    now = [0]
+    cache = ResultCache(maxsize=2, ttl=10, clock=lambda: now[0])
+    for i in range(3):
+        cache.put(cache.key({'arg': i}), i, cache.generation)
+    assert cache.get(cache.key({'arg': 0})) is None
+    assert cache.get(cache.key({'arg': 1})) == 1
+    now[0] = 10
+    assert cache.get(cache.key({'arg': 1})) is None
+    assert cache.info() == CacheInfo(1, 2, 2, 1)
+
+    generation = cache.generation
+    cache.clear()
+    cache.put(cache.key({'arg': 0}), 0, generation)
+    assert cache.info().currsize == 0
+    assert cache.key({'arg': []}) is None
+    with pytest.raises(ValueError):
+        ResultCache(maxsize=0)
+    with pytest.raises(ValueError):
+        ResultCache(ttl=0)
+
+
+def test_cached_sync(pm: PluginManager):
+    calls = []
+
+    class HookSpec(object):
+        @hookspec.sync.first_notnone.cached
+        def lookup(self, key, default=None):
+            pass
+
+    class Plugin1(object):
+        @hookimpl
+        def lookup(self, key, default=None):
+            calls.append(key)
+            return key.upper()
+
+    class Plugin2(object):
+        @hookimpl.try_first
+        def lookup(self, key):
+            return key * 2
+
+    pm.register_specs(HookSpec())
+    pm.register(Plugin1())
+    hook = pm.hooks.lookup
+    assert hook(key='a') == 'A'
+    assert hook(key='a') == 'A'
+    # Keyed on the arguments as passed:
+    assert hook(key='a', default=None) == 'A'
+    assert hook(key='b') == 'B'
+    assert calls == ['a', 'a', 'b']
+    assert hook.cache_info() == CacheInfo(1, 3, 128, 3)
+    # Unhashable arguments aren't cached:
+    assert hook(key='a', default=[]) == 'A'
+    assert calls == ['a', 'a', 'b', 'a']
+    assert hook.cache_info() == CacheInfo(1, 3, 128, 3)
+
+    # Adding or removing hook functions clears the cache:
+    name = pm.register(Plugin2())
+    assert hook(key='a') == 'aa'
+    pm.unregister(name)
+    assert hook(key='a') == 'A'
+    assert calls[-1] == 'a'
+
+
+@pytest.mark.asyncio
+async def test_cached_async(pm: PluginManager):
+    calls = []
+
+    class HookSpec(object):
+        @hookspec.first_notnone.cached(maxsize=None)
+        def lookup(self, key):
+            pass
+
+        @hookspec
+        def other(self):
+            pass
+
+    class Plugin(object):
+        @hookimpl
+        async def lookup(self, key):
+            calls.append(key)
+            if key is None:
+                raise KeyError(key)
+            return key.upper()
+
+    pm.register_specs(HookSpec())
+    pm.register(Plugin())
+    hook = pm.hooks.lookup
+    assert await hook(key='a') == 'A'
+    assert await hook(key='a') == 'A'
+    # Exceptions aren't cached:
+    for _ in range(2):
+        with pytest.raises(KeyError):
+            await hook(key=None)
+    # Nor are calls with options:
+    assert await hook.call({'key': 'a'}, deadline=None) == 'A'
+    assert calls == ['a', None, None, 'a']
+    assert hook.cache_info() == CacheInfo(1, 3, None, 1)
+
+    # Results of calls that started before the cache was cleared are dropped:
+    call = hook(key='b')
+    hook.cache_clear()
+    assert await call == 'B'
+    assert hook.cache_info().currsize == 0
+
+    with pytest.raises(TypeError):
+        pm.hooks.other.cache_info()
+    with pytest.raises(ValueError):
+        PluginManager("example").register_specs(type('Spec', (), {
+            'some_method':
+                hookspec.first_notnone.cached.replay(lambda self: None)
+        }))
+    # Parallel hooks return mutable lists of Results, which can't be shared:
+    with pytest.raises(ValueError):
+        PluginManager("example").register_specs(type('Spec', (), {
+            'some_method': hookspec.cached(lambda self: None)
+        }))
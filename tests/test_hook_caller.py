@@ -0,0 +1,246 @@
+import pytest
+
+from aiopluggy import *
+
+
+hookspec = HookspecMarker("example")
+hookimpl = HookimplMarker("example")
+
+
+def test_plan_is_cached_and_invalidated(pm: PluginManager):
+    class Plugin1(object):
+        @hookimpl
+        def some_method(self, arg):
+            return arg + 1
+
+    class Plugin2(object):
+        @hookimpl.try_first
+        def some_method(self, arg):
+            return arg + 2
+
+    class HookSpec(object):
+        @hookspec.sync
+        def some_method(self, arg):
+            pass
+
+    pm.register(Plugin1())
+    hook = pm.hooks.some_method
+    plan = hook.plan
+    assert hook.plan is plan
+    assert [r.value for r in hook(arg=0)] == [1]
+    assert hook.plan is plan
+
+    pm.register(Plugin2())
+    assert hook.plan is not plan
+    assert [r.value for r in hook(arg=0)] == [2, 1]
+
+    plan = hook.plan
+    pm.register_specs(HookSpec)
+    assert hook.plan is not plan
+    assert [r.value for r in hook(arg=0)] == [2, 1]
+
+
+def test_plan_argument_projection(pm: PluginManager):
+    class HookSpec(object):
+        @hookspec.sync
+        def some_method(self, arg1, arg2='spam'):
+            pass
+
+    class Plugin1(object):
+        @hookimpl
+        def some_method(self, arg1, arg2):
+            return arg1, arg2
+
+    class Plugin2(object):
+        @hookimpl
+        def some_method(self, arg2):
+            return arg2
+
+    pm.register_specs(HookSpec)
+    pm.register(Plugin1())
+    pm.register(Plugin2())
+    (impl2, _, argnames2), (impl1, _, argnames1) = pm.hooks.some_method.plan.functions
+    assert argnames1 is None
+    assert argnames2 == ('arg2',)
+    results = pm.hooks.some_method(arg1=1, arg2=2)
+    assert [r.value for r in results] == [2, (1, 2)]
+
+
+@pytest.mark.asyncio
+async def test_plan_splits_sync_and_async(pm: PluginManager):
+    class Plugin1(object):
+        @hookimpl
+        def some_method(self):
+            return 1
+
+    class Plugin2(object):
+        @hookimpl
+        async def some_method(self):
+            return 2
+
+    class HookSpec(object):
+        @hookspec
+        def some_method(self):
+            pass
+
+    pm.register_specs(HookSpec)
+    pm.register(Plugin1())
+    pm.register(Plugin2())
+    (sync_calls, async_calls), = pm.hooks.some_method.plan.function_groups
+    assert [c[0].plugin.__class__ for c in sync_calls] == [Plugin1]
+    assert [c[0].plugin.__class__ for c in async_calls] == [Plugin2]
+    results = await pm.hooks.some_method()
+    assert [r.value for r in results] == [1, 2]
+
+
+def test_validation_is_memoized_per_call_shape(pm: PluginManager):
+    class HookSpec(object):
+        @hookspec.sync
+        def some_method(self, arg1, arg2='spam'):
+            pass
+
+    pm.register_specs(HookSpec)
+    hook = pm.hooks.some_method
+    hook(arg1=1)
+    hook(arg1=1, arg2=2)
+    hook(arg2=2, arg1=1)
+    assert hook._valid_shapes == {
+        frozenset({'arg1'}), frozenset({'arg1', 'arg2'})
+    }
+    with pytest.raises(TypeError):
+        hook(arg2=2)
+    with pytest.raises(TypeError):
+        hook(arg1=1, foo=2)
+    assert len(hook._valid_shapes) == 2
+
+
+def test_trusted_calls_skip_validation(pm: PluginManager):
+    class HookSpec(object):
+        @hookspec.sync
+        def some_method(self, arg1):
+            pass
+
+    class Plugin1(object):
+        @hookimpl
+        def some_method(self, arg1):
+            return arg1
+
+    class Plugin2(object):
+        @hookimpl
+        def some_method(self):
+            return 'no args'
+
+    pm.register_specs(HookSpec)
+    pm.register(Plugin1())
+    pm.register(Plugin2())
+    hook = pm.hooks.some_method
+    hook.trusted = True
+    with pytest.raises(TypeError):
+        hook(arg2=1)
+    assert [r.value for r in hook(arg1=1)] == ['no args', 1]
+    # Once a call shape has been validated, trusted calls aren't checked. The
+    # results of a mismatching call are undefined per hook function:
+    results = hook(arg2=1)
+    assert hook._valid_shapes == {frozenset({'arg1'})}
+    assert results[0].value == 'no args'
+    with pytest.raises(TypeError):
+        results[1].value
+
+
+def test_map_sync(pm: PluginManager):
+    class HookSpec(object):
+        @hookspec.sync
+        def some_method(self, arg):
+            pass
+
+    class Plugin(object):
+        @hookimpl
+        def some_method(self, arg):
+            return arg * 2
+
+    pm.register_specs(HookSpec)
+    pm.register(Plugin())
+    results = pm.hooks.some_method.map({'arg': i} for i in range(3))
+    assert [r[0].value for r in results] == [0, 2, 4]
+    with pytest.raises(TypeError):
+        list(pm.hooks.some_method.map([{'wrong': 1}]))
+
+
+@pytest.mark.asyncio
+async def test_map_async(pm: PluginManager):
+    import asyncio
+    in_flight = []
+    max_in_flight = []
+
+    class HookSpec(object):
+        @hookspec.first_notnone
+        def some_method(self, arg):
+            pass
+
+    class Plugin(object):
+        @hookimpl
+        async def some_method(self, arg):
+            in_flight.append(arg)
+            max_in_flight.append(len(in_flight))
+            try:
+                await asyncio.sleep(.005 * (5 - arg))
+            finally:
+                in_flight.remove(arg)
+            return arg
+
+    pm.register_specs(HookSpec)
+    pm.register(Plugin())
+    hook = pm.hooks.some_method
+    kwargs = [{'arg': i} for i in range(5)]
+    assert [r async for r in hook.map(kwargs, concurrency=2)] == [0, 1, 2, 3, 4]
+    assert max(max_in_flight) == 2
+    results = [r async for r in hook.map(kwargs, ordered=False)]
+    assert results == [4, 3, 2, 1, 0]
+
+    async with hook.map(kwargs, concurrency=2) as stream:
+        async for result in stream:
+            break
+    await asyncio.sleep(0)
+    assert in_flight == []
+
+
+def test_compact_objects(pm: PluginManager):
+    class Plugin(object):
+        @hookimpl.try_first.before
+        async def some_method(self, arg):
+            pass
+
+    pm.register(Plugin())
+    hookimpl_ = pm.hooks.some_method.before[0]
+    assert not hasattr(hookimpl_, '__dict__')
+    assert hookimpl_.is_try_first and hookimpl_.is_before
+    assert not hookimpl_.is_try_last
+    assert hookimpl_.is_async
+    assert not hasattr(Result(1), '__dict__')
+
+
+def test_call_options_are_checked(pm: PluginManager):
+    class HookSpec(object):
+        @hookspec.sync
+        def sync_parallel(self):
+            pass
+
+        @hookspec.sync.first_notnone
+        def sync_first(self):
+            pass
+
+        @hookspec.first_only
+        def async_first(self):
+            pass
+
+    pm.register_specs(HookSpec())
+    assert pm.hooks.sync_parallel.call({}, values='raise') == []
+    for hook, option in ((pm.hooks.sync_parallel, 'deadline'),
+                         (pm.hooks.sync_parallel, 'max_concurrency'),
+                         (pm.hooks.sync_first, 'values'),
+                         (pm.hooks.async_first, 'fail_fast'),
+                         (pm.hooks.async_first, 'functions')):
+        with pytest.raises(TypeError) as excinfo:
+            hook.call({}, **{option: 1})
+        assert option in str(excinfo.value)
+        assert hook.name in str(excinfo.value)
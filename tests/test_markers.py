@@ -14,6 +14,12 @@ def test_spec_qualifiers():
     hookspec.replay
     hookspec.sync
     hookspec.required
+    hookspec.bounded
+    hookspec.race
+    hookspec.values
+    hookspec.fail_fast
+    hookspec.reduce
+    hookspec.cached
     with pytest.raises(AttributeError):
         # noinspection PyUnresolvedReferences
         hookspec.non_existing
@@ -27,6 +33,23 @@ def test_impl_qualifiers():
     hookimpl.try_last
     hookimpl.dont_await
     hookimpl.before
+    hookimpl.timeout
     with pytest.raises(AttributeError):
         # noinspection PyUnresolvedReferences
         hookimpl.non_existing
+
+
+def test_qualifier_options():
+    marker = hookspec.replay(maxlen=10).sync
+    assert marker.flags == {'replay': {'maxlen': 10}, 'sync': {}}
+
+    @marker
+    def f():
+        pass
+    assert getattr(f, marker.specmarker) == marker.flags
+    with pytest.raises(TypeError):
+        hookspec.replay(non_existing=1)
+    with pytest.raises(TypeError):
+        hookspec.sync(maxlen=10)
+    with pytest.raises(TypeError):
+        hookspec(maxlen=10)
@@ -0,0 +1,95 @@
+import pytest
+
+from aiopluggy import *
+from aiopluggy.helpers import fqn
+from aiopluggy.metrics import Stats
+
+
+hookspec = HookspecMarker("example")
+hookimpl = HookimplMarker("example")
+
+
+def test_stats_buckets():
+    stats = Stats((.1, 1.0))
+    stats.observe(.05)
+    stats.observe(.1)
+    stats.observe(.5, failed=True)
+    stats.observe(5)
+    snapshot = stats.snapshot()
+    assert snapshot['calls'] == 4
+    assert snapshot['exceptions'] == 1
+    assert snapshot['buckets'] == {'0.1': 2, '1.0': 3, '+Inf': 4}
+
+
+@pytest.mark.asyncio
+async def test_metrics(pm: PluginManager):
+    class HookSpec(object):
+        @hookspec
+        def some_method(self, arg):
+            pass
+
+    class Plugin1(object):
+        @hookimpl
+        async def some_method(self, arg):
+            return arg
+
+    class Plugin2(object):
+        @hookimpl
+        def some_method(self, arg):
+            raise ValueError()
+
+    pm.register_specs(HookSpec())
+    pm.register(Plugin1())
+    pm.register(Plugin2())
+    # Statistics are per plugin class:
+    name1 = fqn(Plugin1)
+    name2 = fqn(Plugin2)
+    hook = pm.hooks.some_method
+    plan = hook.plan
+    await hook(arg=1)
+    assert hook.plan is plan
+
+    metrics = pm.enable_metrics()
+    assert hook.plan is not plan
+    await hook(arg=1)
+    await hook(arg=2)
+    snapshot = metrics.snapshot()
+    assert snapshot['hooks']['some_method']['calls'] == 2
+    assert snapshot['hookimpls']['some_method'][name1]['calls'] == 2
+    assert snapshot['hookimpls']['some_method'][name1]['exceptions'] == 0
+    assert snapshot['hookimpls']['some_method'][name2]['exceptions'] == 2
+    name3 = pm.register(Plugin1())
+    await hook(arg=3)
+    pm.unregister(name3)
+    snapshot = metrics.snapshot()
+    assert snapshot['hookimpls']['some_method'][name1]['calls'] == 4
+    assert len(snapshot['hookimpls']['some_method']) == 2
+
+    text = metrics.render_prometheus()
+    assert '# TYPE aiopluggy_hook_duration_seconds histogram' in text
+    assert 'aiopluggy_hook_calls_total{hook="some_method"} 3\n' in text
+    assert ('aiopluggy_hookimpl_exceptions_total{hook="some_method",'
+            'plugin="%s"} 3\n' % name2) in text
+    assert 'aiopluggy_hook_duration_seconds_bucket{hook="some_method",' \
+           'le="+Inf"} 3\n' in text
+
+    pm.disable_metrics()
+    assert 'call' not in hook.__dict__
+    await hook(arg=4)
+    assert metrics.hooks['some_method'].calls == 3
+
+
+def test_metrics_sync_and_new_hooks(pm: PluginManager):
+    metrics = pm.enable_metrics(buckets=(1.0,))
+
+    class Plugin(object):
+        @hookimpl
+        def some_method(self, arg):
+            return arg
+
+    pm.register(Plugin())
+    pm.hooks.some_method(arg=1)
+    assert metrics.hooks['some_method'].calls == 1
+    assert list(metrics.hookimpls['some_method'].values())[0].calls == 1
+    metrics.reset()
+    assert metrics.hooks['some_method'].calls == 0
@@ -1,3 +1,5 @@
+import asyncio
+
 import pytest
 
 from aiopluggy import *
@@ -110,3 +112,269 @@ async def test_replay(pm: PluginManager):
     assert out == [1]
     await pm.hooks.replay_me1(arg=3)
     assert out == [1, 2, 3]
+
+
+@pytest.mark.asyncio
+async def test_replay_retention(pm: PluginManager):
+    out = []
+
+    class Spec:
+        @hookspec.replay(maxlen=2)
+        def replay_me(self, arg):
+            pass
+
+    class Impl:
+        @hookimpl
+        def replay_me(self, arg):
+            out.append(arg)
+
+    pm.register_specs(Spec)
+    for i in range(5):
+        await pm.hooks.replay_me(arg=i)
+    assert len(pm.history['replay_me']) == 2
+    pm.register(Impl())
+    assert out == [3, 4]
+
+
+@pytest.mark.asyncio
+async def test_replay_per_hook(pm: PluginManager):
+    out = []
+
+    class Spec:
+        @hookspec.replay
+        def replay_me1(self, arg):
+            pass
+
+        @hookspec.replay
+        def replay_me2(self, arg):
+            pass
+
+    class Impl1:
+        @hookimpl
+        def replay_me1(self, arg):
+            out.append((1, arg))
+
+    class Impl2:
+        @hookimpl
+        def replay_me1(self, arg):
+            out.append((2, arg))
+
+    pm.register_specs(Spec)
+    await pm.hooks.replay_me1(arg='a')
+    await pm.hooks.replay_me2(arg='b')
+    await pm.hooks.replay_me1(arg='c')
+    pm.register(Impl1())
+    assert out == [(1, 'a'), (1, 'c')]
+    pm.register(Impl2())
+    assert out == [(1, 'a'), (1, 'c'), (2, 'a'), (2, 'c')]
+    assert pm.replay_to == {}
+
+
+@pytest.mark.asyncio
+async def test_replay_historic_order_across_hooks(pm: PluginManager):
+    out = []
+
+    class Spec:
+        @hookspec.replay
+        def replay_a(self, arg):
+            pass
+
+        @hookspec.replay
+        def replay_b(self, arg):
+            pass
+
+    class Impl:
+        @hookimpl
+        def replay_a(self, arg):
+            out.append(('a', arg))
+
+        @hookimpl
+        def replay_b(self, arg):
+            out.append(('b', arg))
+
+    pm.register_specs(Spec)
+    await pm.hooks.replay_b(arg=1)
+    await pm.hooks.replay_a(arg=2)
+    await pm.hooks.replay_b(arg=3)
+    pm.register(Impl())
+    assert out == [('b', 1), ('a', 2), ('b', 3)]
+
+
+@pytest.mark.asyncio
+async def test_replay_calling_other_hooks(pm: PluginManager):
+    out = []
+
+    class Spec:
+        @hookspec.replay
+        def replay_me(self, arg):
+            pass
+
+        @hookspec
+        def other(self, arg):
+            pass
+
+    class Impl:
+        @hookimpl
+        async def replay_me(self, arg):
+            await pm.hooks.other(arg=arg)
+
+        @hookimpl
+        async def other(self, arg):
+            out.append(arg)
+
+    pm.register_specs(Spec)
+    await pm.hooks.replay_me(arg=1)
+    pm.register(Impl())
+    await asyncio.wait_for(pm.hooks.other(arg=2), 1)
+    assert out == [1, 2]
+    assert pm.unhandled_exceptions == []
+
+
+@pytest.mark.asyncio
+async def test_unregister(pm: PluginManager):
+    started = asyncio.Event()
+    release = asyncio.Event()
+    before = []
+
+    class HookSpec(object):
+        @hookspec
+        def some_method(self):
+            pass
+
+    class Plugin1(object):
+        @hookimpl
+        async def some_method(self):
+            started.set()
+            await release.wait()
+            return 1
+
+    class Plugin2(object):
+        @hookimpl.before
+        def some_method(self):
+            before.append(True)
+
+    pm.register_specs(HookSpec())
+    plugin1 = Plugin1()
+    pm.register(plugin1)
+    name2 = pm.register(Plugin2(), max_concurrency=1)
+    hook = pm.hooks.some_method
+    call = asyncio.ensure_future(hook())
+    await started.wait()
+    pm.unregister(plugin1)
+    pm.unregister(name2)
+    assert hook.functions == [] and hook.before == []
+    assert pm.registered_plugins == set()
+    assert pm.plugin_semaphores == {}
+    release.set()
+    # The call in progress still sees the plugins:
+    assert [r.value for r in await call] == [1]
+    assert await hook() == []
+    assert before == [True]
+    with pytest.raises(ValueError):
+        pm.unregister(plugin1)
+    # Plugins can be registered again:
+    pm.register(plugin1)
+    assert len(hook.functions) == 1
+
+
+def test_load_entrypoints(pm: PluginManager, monkeypatch):
+    import sys
+    import plugin
+    import plugin_spec
+    loaded = []
+
+    class EntryPoint(object):
+        def __init__(self, name, module):
+            self.name = name
+            self.module = module
+
+        def load(self):
+            loaded.append(self.name)
+            return self.module
+
+    class Eager(object):
+        @hookimpl
+        def eager_method(self):
+            pass
+
+    entry_points = [EntryPoint('lazy', plugin), EntryPoint('eager', Eager())]
+    monkeypatch.setattr(
+        sys.modules['aiopluggy.plugin_manager'], '_entry_points',
+        lambda group: entry_points
+    )
+    hook_names = {'lazy': pm.hook_names(plugin)}
+    assert hook_names['lazy'] == ['class1_impl', 'class2_impl', 'function_impl']
+    pm.register_specs(plugin_spec)
+    assert pm.load_entrypoints('example', hook_names) == ['lazy', 'eager']
+    assert loaded == ['eager']
+    assert pm.hooks.function_impl.functions == []
+    pm.hooks.class1_impl(arg1=1, arg2=2)
+    assert loaded == ['eager', 'lazy']
+    assert len(pm.hooks.function_impl.functions) == 1
+    assert pm.hooks.function_impl.lazy_plugins == []
+
+
+def test_load_entrypoints_on_missing(pm: PluginManager, monkeypatch):
+    import sys
+
+    class HookSpec(object):
+        @hookspec.required
+        def some_method(self):
+            pass
+
+    class Plugin(object):
+        @hookimpl
+        def some_method(self):
+            pass
+
+    class EntryPoint(object):
+        name = 'plugin'
+
+        def load(self):
+            return Plugin()
+
+    monkeypatch.setattr(
+        sys.modules['aiopluggy.plugin_manager'], '_entry_points',
+        lambda group: [EntryPoint()]
+    )
+    pm.register_specs(HookSpec())
+    pm.load_entrypoints('example', {'plugin': ['some_method']})
+    assert pm.hooks.some_method.functions == []
+    assert pm.missing() == {}
+    assert pm.unimplemented() == {}
+    assert len(pm.hooks.some_method.functions) == 1
+
+
+def test_register_instances_uses_class_cache(pm: PluginManager, monkeypatch):
+    from aiopluggy.hooks import HookImpl
+    parsed = []
+    parse_args = HookImpl.parse_args
+
+    def counting_parse_args(plugin, name, function):
+        parsed.append(name)
+        return parse_args(plugin, name, function)
+    monkeypatch.setattr(
+        HookImpl, 'parse_args', staticmethod(counting_parse_args)
+    )
+
+    class Plugin(object):
+        def __init__(self, value):
+            self.value = value
+
+        @hookimpl
+        def some_method(self, arg):
+            return arg + self.value
+
+    for value in range(3):
+        pm.register(Plugin(value))
+    assert parsed == ['some_method']
+    assert sorted(r.value for r in pm.hooks.some_method(arg=10)) == [10, 11, 12]
+
+    @hookimpl
+    def other_method(arg):
+        return arg
+    plugin = Plugin(3)
+    plugin.other_method = other_method
+    pm.register(plugin)
+    assert parsed == ['some_method', 'other_method']
+    assert [r.value for r in pm.hooks.other_method(arg=1)] == [1]
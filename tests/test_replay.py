@@ -0,0 +1,120 @@
+import asyncio
+import gc
+import weakref
+
+import pytest
+
+from aiopluggy.replay import ReplayHistory, ReplayScheduler
+
+
+def test_history_unbounded():
+    history = ReplayHistory()
+    for i in range(5):
+        history.append({'arg': i})
+    assert [kwargs['arg'] for kwargs in history] == [0, 1, 2, 3, 4]
+
+
+def test_history_maxlen():
+    history = ReplayHistory(maxlen=2)
+    for i in range(5):
+        history.append({'arg': i})
+    assert [kwargs['arg'] for kwargs in history] == [3, 4]
+    with pytest.raises(ValueError):
+        ReplayHistory(maxlen=0)
+
+
+def test_history_key():
+    history = ReplayHistory(key='name')
+    history.append({'name': 'a', 'arg': 1})
+    history.append({'name': 'b', 'arg': 2})
+    history.append({'name': 'a', 'arg': 3})
+    assert list(history) == [{'name': 'b', 'arg': 2}, {'name': 'a', 'arg': 3}]
+
+    history = ReplayHistory(key=lambda kwargs: kwargs['arg'] % 2, maxlen=1)
+    history.append({'arg': 1})
+    history.append({'arg': 2})
+    history.append({'arg': 3})
+    assert list(history) == [{'arg': 3}]
+
+
+def test_history_ttl():
+    now = [0.0]
+    history = ReplayHistory(ttl=10, clock=lambda: now[0])
+    history.append({'arg': 1})
+    now[0] = 5.0
+    history.append({'arg': 2})
+    assert len(history) == 2
+    now[0] = 12.0
+    assert list(history) == [{'arg': 2}]
+    now[0] = 20.0
+    assert list(history) == []
+
+
+def test_history_weak():
+    class Value(object):
+        pass
+
+    history = ReplayHistory(weak=True)
+    value1, value2 = Value(), Value()
+    history.append({'arg': value1, 'number': 1})
+    history.append({'arg': value2, 'number': 2})
+    del value1
+    gc.collect()
+    assert list(history) == [{'arg': value2, 'number': 2}]
+
+
+def test_history_weak_key():
+    class Value(object):
+        pass
+
+    history = ReplayHistory(key='arg', weak=True)
+    value1, value2 = Value(), Value()
+    history.append({'arg': value1, 'number': 1})
+    history.append({'arg': value2, 'number': 2})
+    history.append({'arg': value1, 'number': 3})
+    assert list(history) == [
+        {'arg': value2, 'number': 2}, {'arg': value1, 'number': 3}
+    ]
+    ref = weakref.ref(value1)
+    del value1
+    gc.collect()
+    assert ref() is None
+    assert list(history) == [{'arg': value2, 'number': 2}]
+
+
+@pytest.mark.asyncio
+async def test_scheduler_concurrency_limit():
+    running, peak, errors = [0], [0], []
+
+    async def replay(i):
+        running[0] += 1
+        peak[0] = max(peak[0], running[0])
+        await asyncio.sleep(0.01)
+        running[0] -= 1
+        if i == 3:
+            raise ValueError(i)
+
+    scheduler = ReplayScheduler(errors, max_concurrency=2)
+    for i in range(6):
+        scheduler.schedule(i, replay(i))
+    assert scheduler.busy and len(scheduler) == 6
+    await scheduler.drain()
+    assert peak[0] == 2
+    assert [(hookimpl, str(e)) for hookimpl, e in errors] == [(3, '3')]
+    assert not scheduler.busy and len(scheduler) == 0
+
+
+@pytest.mark.asyncio
+async def test_scheduler_drains_replays_scheduled_meanwhile():
+    out = []
+    scheduler = ReplayScheduler([])
+
+    async def replay(i):
+        out.append(i)
+        if i == 0:
+            scheduler.schedule(1, replay(1))
+
+    scheduler.schedule(0, replay(0))
+    await asyncio.gather(scheduler.drain(), scheduler.drain())
+    assert out == [0, 1]
+    assert not scheduler.busy
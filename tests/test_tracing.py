@@ -0,0 +1,95 @@
+import pytest
+
+from aiopluggy import *
+
+
+hookspec = HookspecMarker("example")
+hookimpl = HookimplMarker("example")
+
+
+@pytest.mark.asyncio
+async def test_hookcall_monitoring(pm: PluginManager):
+    out = []
+
+    class HookSpec(object):
+        @hookspec
+        def some_method(self, arg):
+            pass
+
+        @hookspec.sync.first_notnone
+        def other_method(self, arg):
+            pass
+
+    class Plugin(object):
+        @hookimpl
+        async def some_method(self, arg):
+            return arg
+
+        @hookimpl
+        def other_method(self, arg):
+            raise ValueError(arg)
+
+    def before(hook_name, hookimpls, kwargs):
+        out.append(('before', hook_name, len(hookimpls), kwargs))
+
+    def after(outcome, hook_name, hookimpls, kwargs):
+        value = [r.value for r in outcome.value] \
+            if outcome.exception is None else type(outcome.exception)
+        out.append(('after', hook_name, value))
+
+    pm.register_specs(HookSpec())
+    pm.register(Plugin())
+    undo = pm.add_hookcall_monitoring(before, after)
+    assert [r.value for r in await pm.hooks.some_method(arg=1)] == [1]
+    with pytest.raises(ValueError):
+        pm.hooks.other_method(arg=2)
+    assert out == [
+        ('before', 'some_method', 1, {'arg': 1}),
+        ('after', 'some_method', [1]),
+        ('before', 'other_method', 1, {'arg': 2}),
+        ('after', 'other_method', ValueError),
+    ]
+
+    undo()
+    assert 'call' not in pm.hooks.some_method.__dict__
+    await pm.hooks.some_method(arg=1)
+    assert len(out) == 4
+
+
+def test_enable_tracing(pm: PluginManager):
+    lines = []
+
+    class Plugin(object):
+        @hookimpl
+        def some_method(self, arg):
+            return arg
+
+    undo = pm.enable_tracing(lines.append)
+    # Hooks created after tracing was enabled are traced as well:
+    pm.register(Plugin())
+    pm.hooks.some_method(arg=1)
+    undo()
+    pm.hooks.some_method(arg=1)
+    assert len(lines) == 2
+    assert lines[0] == "some_method {'arg': 1} [hook]\n"
+    assert lines[1].startswith("finish some_method --> [")
+
+
+def test_monitoring_with_metrics(pm: PluginManager):
+    calls = []
+
+    class Plugin(object):
+        @hookimpl
+        def some_method(self):
+            pass
+
+    pm.register(Plugin())
+    metrics = pm.enable_metrics()
+    undo = pm.add_hookcall_monitoring(
+        lambda *args: calls.append(args), lambda *args: None
+    )
+    pm.hooks.some_method()
+    undo()
+    pm.hooks.some_method()
+    assert len(calls) == 1
+    assert metrics.hooks['some_method'].calls == 2